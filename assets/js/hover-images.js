@@ -0,0 +1,19 @@
+// hover-images.js — las imágenes hover de la home (.img-hover[data-src]) se cargan recién
+// en el primer hover/foco de su card. Hasta entonces el src es el placeholder (LQIP) que
+// escribe tools/lqip_thumbs.py, así no suman peso ni demoran el preloader en la carga inicial.
+(() => {
+  const load = (media) => {
+    media.querySelectorAll("img.img-hover[data-src]").forEach((img) => {
+      img.src = img.getAttribute("data-src");
+      img.removeAttribute("data-src");
+    });
+  };
+
+  const onEnter = (e) => {
+    const media = e.target.closest?.(".media");
+    if (media) load(media);
+  };
+
+  document.addEventListener("pointerover", onEnter, { passive: true });
+  document.addEventListener("focusin", onEnter);
+})();
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_retina_ir.py
+
+Benchmark de la IR compacta de retina_scale_css.py sobre los CSS del sitio, contra el
+ParseCache anterior (que guardaba las reglas top-level de tinycss2 por archivo):
+- Memoria retenida por MB de CSS: esas reglas de tinycss2 vs StylesheetIR (lo que guarda
+  ParseCache ahora). Medido con tracemalloc.
+- Tiempo de re-emisión con caché caliente: desde los árboles cacheados (el emisor anterior
+  re-parseaba declaraciones y bloques anidados en cada emisión: acá se reproduce con
+  _build_rule sobre las reglas cacheadas) vs desde la IR. También generación en frío y
+  carga de la IR serializada.
+
+Uso:
+  python tools/bench_retina_ir.py [--root .] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import hashlib
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import tinycss2
+
+from retina_scale_css import (
+    OverrideOptions,
+    ParseCache,
+    StylesheetIR,
+    _build_rule,
+    _strip_comments_nested,
+    build_stylesheet_ir,
+    generate_override_text,
+    load_stylesheet_irs,
+    save_stylesheet_irs,
+)
+
+
+def _retained_bytes(build: Callable[[], object]) -> int:
+    """Bytes que siguen vivos mientras se mantiene el resultado de build()."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return after - before
+
+
+def _best_of(repeat: int, fn: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _parse_tree(name: str, text: str) -> Tuple[str, str, List, int]:
+    """Entrada del ParseCache anterior: (nombre, digest, reglas top-level de tinycss2, errores)."""
+    digest = hashlib.sha1(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+    rules = tinycss2.parse_stylesheet(_strip_comments_nested(text), skip_whitespace=True, skip_comments=True)
+    return name, digest, rules, sum(1 for r in rules if getattr(r, "type", None) == "error")
+
+
+def _cache_from_trees(trees: List[Tuple[str, str, List, int]]) -> ParseCache:
+    """Lo que el emisor anterior rehacía en cada emisión a partir de los árboles cacheados."""
+    return ParseCache(
+        StylesheetIR(name, digest, errors, tuple(ir for ir in map(_build_rule, rules) if ir is not None))
+        for name, digest, rules, errors in trees
+    )
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark de memoria/tiempo de la IR de retina_scale_css.")
+    ap.add_argument("--root", default=".", help="Root del proyecto (default: .)")
+    ap.add_argument("--css", nargs="+", default=["assets/css/*.css", "testimonials/assets/css/*.css"], help="Globs de CSS")
+    ap.add_argument("--repeat", type=int, default=5, help="Repeticiones (se toma la mejor) (default: 5)")
+    args = ap.parse_args(argv)
+
+    root = Path(args.root).resolve()
+    files = [p for pat in args.css for p in sorted(root.glob(pat)) if p.name != "retina-80.css"]
+    sources: List[Tuple[str, str]] = [
+        (p.relative_to(root).as_posix(), p.read_text(encoding="utf-8", errors="ignore")) for p in files
+    ]
+    if not sources:
+        print("ERROR: no hay CSS para medir")
+        return 2
+    mb = sum(len(t.encode("utf-8")) for _, t in sources) / (1024 * 1024)
+    options = OverrideOptions()
+
+    tree_bytes = _retained_bytes(lambda: [_parse_tree(n, t) for n, t in sources])
+    ir_bytes = _retained_bytes(lambda: [build_stylesheet_ir(n, t) for n, t in sources])
+
+    cache = ParseCache()
+    generate_override_text(sources, options, cache=cache)
+    cold = _best_of(args.repeat, lambda: generate_override_text(sources, options))
+    trees = [_parse_tree(n, t) for n, t in sources]
+    warm_tree = _best_of(
+        args.repeat, lambda: generate_override_text(sources, options, cache=_cache_from_trees(trees))
+    )
+    warm = _best_of(args.repeat, lambda: generate_override_text(sources, options, cache=cache))
+    rescale = _best_of(args.repeat, lambda: generate_override_text(sources, OverrideOptions(scale=0.75), cache=cache))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ir_path = Path(tmp) / "retina-ir.pickle"
+        save_stylesheet_irs(ir_path, cache.snapshot())
+        ir_file_bytes = ir_path.stat().st_size
+        load = _best_of(args.repeat, lambda: load_stylesheet_irs(ir_path))
+    parse = _best_of(args.repeat, lambda: [build_stylesheet_ir(n, t) for n, t in sources])
+
+    print("\n=== RETINA IR BENCHMARK ===")
+    print(f"css files: {len(sources)} ({mb:.3f} MB)")
+    print(f"retained cached trees:  {tree_bytes / 1024:.0f} KiB ({tree_bytes / mb / 1024 / 1024:.2f} MB per MB of CSS)")
+    print(f"retained IR:            {ir_bytes / 1024:.0f} KiB ({ir_bytes / mb / 1024 / 1024:.2f} MB per MB of CSS)")
+    print(f"memory ratio tree/IR:   {tree_bytes / max(ir_bytes, 1):.1f}x")
+    print(f"IR on disk:             {ir_file_bytes / 1024:.0f} KiB")
+    print(f"generate cold (parse+IR+emit): {cold * 1000:.1f} ms")
+    print(f"re-emit from cached trees:     {warm_tree * 1000:.1f} ms (previous ParseCache)")
+    print(f"re-emit from cached IR:        {warm * 1000:.1f} ms ({warm_tree / max(warm, 1e-9):.1f}x faster than cached trees)")
+    print(f"re-emit, other scale:          {rescale * 1000:.1f} ms")
+    print(f"build IR from text:            {parse * 1000:.1f} ms")
+    print(f"load IR from disk:             {load * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
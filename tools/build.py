@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+build.py
+
+Build del sitio completo como grafo de dependencias:
+- Cada nodo (stage) declara sus entradas/salidas como archivos; su firma es el hash del
+  contenido de las entradas + el código de las herramientas que usa + sus opciones.
+- Un nodo está al día si la firma de entradas y el hash de salidas coinciden con el último
+  build (.build-state.json): se saltea.
+- Nodos independientes corren en paralelo en un pool de workers; los que parchean el mismo
+  HTML se encadenan por dependencia.
+- Al final, un resumen único con estado y tiempos de cada nodo.
+
+Los stages que editan HTML en el lugar (lqip-thumbs, lazy-images, bundle-js) son idempotentes:
+la firma que se guarda es la de los archivos al TERMINAR el build, así el siguiente build los saltea.
+
+Uso:
+  python tools/build.py                 # reconstruye lo que cambió
+  python tools/build.py --dry-run       # muestra qué correría
+  python tools/build.py --only retina-css
+  python tools/build.py --force --jobs 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from bundle_js import bundle_site, write_bundles
+from lazy_images import DEFAULT_CHROME_IN, DEFAULT_KEEP_EAGER_IN, lazy_images_site
+from lqip_thumbs import DEFAULT_IMAGES_DIR, DEFAULT_PAGE, LQIP_PARAMS, lqip_page
+from retina_scale_css import (
+    IR_CACHE_FILE,
+    OverrideOptions,
+    ParseCache,
+    generate_override_text,
+    resolve_css_files_in_order,
+)
+from site_io import DEFAULT_PAGES, find_pages, write_text_if_changed
+
+
+TOOLS_DIR = Path(__file__).resolve().parent
+STATE_FILE = ".build-state.json"
+
+_IMAGE_GLOBS = ["**/*.jpg", "**/*.jpeg", "**/*.png", "**/*.gif", "**/*.svg"]
+
+
+# -----------------------------
+# Tipos y helpers
+# -----------------------------
+
+@dataclass
+class Stage:
+    name: str
+    deps: Tuple[str, ...]
+    inputs: Callable[[Path], List[Path]]
+    outputs: Callable[[Path], List[Path]]
+    run: Callable[[Path, int], str]  # (root, jobs) -> nota para el resumen
+    tools: Tuple[str, ...] = ()
+    options: str = ""
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str  # "built" | "up-to-date" | "would build" | "failed" | "skipped"
+    seconds: float = 0.0
+    note: str = ""
+
+
+@dataclass
+class BuildReport:
+    results: Dict[str, StageResult] = field(default_factory=dict)
+    seconds: float = 0.0
+    files_hashed: int = 0
+
+    @property
+    def failed(self) -> bool:
+        return any(r.status == "failed" for r in self.results.values())
+
+
+class _HashCache:
+    """sha1 por archivo, reusado mientras (size, mtime_ns) no cambie. Thread-safe."""
+
+    def __init__(self, entries: Dict[str, list]) -> None:
+        self._lock = threading.Lock()
+        self._entries = entries
+        self.hashed = 0
+
+    def digest(self, root: Path, path: Path) -> str:
+        rel = path.relative_to(root).as_posix()
+        try:
+            st = path.stat()
+        except OSError:
+            return "missing"
+        with self._lock:
+            entry = self._entries.get(rel)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        h = hashlib.sha1()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        with self._lock:
+            self._entries[rel] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+            self.hashed += 1
+        return h.hexdigest()
+
+    def entries(self) -> Dict[str, list]:
+        with self._lock:
+            return dict(self._entries)
+
+
+def _files_signature(root: Path, paths: List[Path], hashes: _HashCache, extra: str = "") -> str:
+    h = hashlib.sha1(extra.encode("utf-8"))
+    for p in sorted(set(paths)):
+        h.update(p.relative_to(root).as_posix().encode("utf-8"))
+        h.update(hashes.digest(root, p).encode("ascii"))
+    return h.hexdigest()
+
+
+def _glob_all(root: Path, patterns: List[str], *, exclude: Tuple[str, ...] = ()) -> List[Path]:
+    out = set()
+    for pat in patterns:
+        for p in root.glob(pat):
+            rel = p.relative_to(root).as_posix()
+            if p.is_file() and not rel.startswith(".git/") and not any(rel.startswith(e) for e in exclude):
+                out.add(p.resolve())
+    return sorted(out)
+
+
+# -----------------------------
+# Stages del sitio
+# -----------------------------
+
+_RETINA_OPTIONS = OverrideOptions(include_pointer_fine=False)
+_RETINA_OUT = "assets/css/retina-80.css"
+_RETINA_INDEX = "index.html"
+_BUNDLE_DIR = "assets/js/bundles"
+_EAGER_IMAGES = 4
+
+
+def _retina_sources(root: Path) -> List[Path]:
+    """CSS en el orden de cascada de los <link> de index.html (igual que --order-from-html)."""
+    out = root / _RETINA_OUT
+    return resolve_css_files_in_order(root, out.parent, root / _RETINA_INDEX, out.name, only_linked=False)
+
+
+def _retina_inputs(root: Path) -> List[Path]:
+    # index.html define el orden: un <link> movido cambia la salida.
+    return [(root / _RETINA_INDEX).resolve()] + _retina_sources(root)
+
+
+def _run_retina(root: Path, jobs: int) -> str:
+    sources = [
+        (p.relative_to(root).as_posix(), p.read_text(encoding="utf-8", errors="ignore")) for p in _retina_sources(root)
+    ]
+    # IR cacheada: solo se re-parsean los CSS que cambiaron desde el último build.
+    cache = ParseCache.load(root / IR_CACHE_FILE)
+    before = {ir.name: ir.digest for ir in cache.snapshot()}
+    content, report = generate_override_text(sources, _RETINA_OPTIONS, cache=cache)
+    reparsed = sum(1 for ir in cache.snapshot() if before.get(ir.name) != ir.digest)
+    cache.save(root / IR_CACHE_FILE, [name for name, _ in sources])
+    wrote, _ = write_text_if_changed(root / _RETINA_OUT, content)
+    warn = f" | {len(report.warnings)} warning(s)" if report.warnings else ""
+    return (
+        f"{report.total_px_replaced} px in {report.rules_emitted} rules{'' if wrote else ' (unchanged)'}"
+        f", {reparsed}/{len(sources)} css re-parsed{warn}"
+    )
+
+
+def _lqip_inputs(root: Path) -> List[Path]:
+    return [(root / DEFAULT_PAGE).resolve()] + _glob_all(root, [DEFAULT_IMAGES_DIR + "/*"])
+
+
+def _run_lqip(root: Path, jobs: int) -> str:
+    report = lqip_page(
+        root=root,
+        page=(root / DEFAULT_PAGE).resolve(),
+        images_dir=(root / DEFAULT_IMAGES_DIR).resolve(),
+        workers=jobs,
+        dry_run=False,
+        backup=False,
+    )
+    net = report.bytes_deferred - report.bytes_inlined
+    return f"{report.images} thumbs ({report.computed} computed), -{net / 1024:.0f} KiB on first load"
+
+
+def _lazy_inputs(root: Path) -> List[Path]:
+    return find_pages(root, DEFAULT_PAGES) + _glob_all(root, _IMAGE_GLOBS)
+
+
+def _run_lazy(root: Path, jobs: int) -> str:
+    report = lazy_images_site(
+        root=root,
+        pages=find_pages(root, DEFAULT_PAGES),
+        eager=_EAGER_IMAGES,
+        keep_eager_in=list(DEFAULT_KEEP_EAGER_IN),
+        chrome_in=list(DEFAULT_CHROME_IN),
+        workers=jobs,
+        dry_run=False,
+        backup=False,
+    )
+    lazy = sum(r.lazy for r in report.per_page)
+    return f"{report.pages_changed} page(s) rewritten, {lazy} lazy img, {report.images_read} headers"
+
+
+def _bundle_inputs(root: Path) -> List[Path]:
+    scripts = _glob_all(root, ["assets/**/*.js", "testimonials/assets/**/*.js"], exclude=(_BUNDLE_DIR + "/",))
+    return find_pages(root, DEFAULT_PAGES) + scripts
+
+
+def _bundle_outputs(root: Path) -> List[Path]:
+    return find_pages(root, DEFAULT_PAGES) + _glob_all(root, [_BUNDLE_DIR + "/*.js"])
+
+
+def _run_bundle(root: Path, jobs: int) -> str:
+    out_dir = (root / _BUNDLE_DIR).resolve()
+    report = bundle_site(root=root, pages=find_pages(root, DEFAULT_PAGES), out_dir=out_dir, dry_run=False, backup=False)
+    written, removed = write_bundles(out_dir, report.bundles, prune=True)
+    return f"{report.pages_changed} page(s) patched, {len(report.bundles)} bundles ({written} written, {removed} pruned)"
+
+
+def site_stages() -> List[Stage]:
+    """Grafo del sitio. lqip-thumbs, lazy-images y bundle-js editan el mismo HTML: van encadenados."""
+    return [
+        Stage(
+            name="retina-css",
+            deps=(),
+            inputs=_retina_inputs,
+            outputs=lambda root: [root / _RETINA_OUT],
+            run=_run_retina,
+            tools=("retina_scale_css.py", "site_io.py"),
+            options=repr(_RETINA_OPTIONS),
+        ),
+        Stage(
+            name="lqip-thumbs",
+            deps=(),
+            inputs=_lqip_inputs,
+            outputs=lambda root: [(root / DEFAULT_PAGE).resolve()],
+            run=_run_lqip,
+            tools=("lqip_thumbs.py", "lazy_images.py", "site_io.py"),
+            options=LQIP_PARAMS,
+        ),
+        Stage(
+            name="lazy-images",
+            deps=("lqip-thumbs",),
+            inputs=_lazy_inputs,
+            outputs=lambda root: find_pages(root, DEFAULT_PAGES),
+            run=_run_lazy,
+            tools=("lazy_images.py", "site_io.py"),
+            options=f"eager={_EAGER_IMAGES};keep={DEFAULT_KEEP_EAGER_IN};chrome={DEFAULT_CHROME_IN}",
+        ),
+        Stage(
+            name="bundle-js",
+            deps=("lazy-images",),
+            inputs=_bundle_inputs,
+            outputs=_bundle_outputs,
+            run=_run_bundle,
+            tools=("bundle_js.py", "site_io.py"),
+        ),
+    ]
+
+
+# -----------------------------
+# Scheduler
+# -----------------------------
+
+def _select(stages: Dict[str, Stage], only: Optional[List[str]]) -> List[str]:
+    """Stages pedidos + sus dependencias transitivas, en orden topológico."""
+    wanted: Set[str] = set()
+
+    def add(name: str) -> None:
+        if name in wanted:
+            return
+        wanted.add(name)
+        for d in stages[name].deps:
+            add(d)
+
+    for name in (only or list(stages)):
+        add(name)
+    order: List[str] = []
+    done: Set[str] = set()
+
+    def visit(name: str) -> None:
+        if name in done:
+            return
+        for d in stages[name].deps:
+            visit(d)
+        done.add(name)
+        order.append(name)
+
+    for name in stages:
+        if name in wanted:
+            visit(name)
+    return order
+
+
+def _signature(stage: Stage, root: Path, hashes: _HashCache, files: Callable[[Path], List[Path]]) -> str:
+    tools = [TOOLS_DIR / t for t in stage.tools]
+    extra = stage.options + "|" + "|".join(hashes.digest(TOOLS_DIR.parent, t) for t in tools if t.exists())
+    return _files_signature(root, files(root), hashes, extra)
+
+
+def run_build(
+    *,
+    root: Path,
+    stages: List[Stage],
+    only: Optional[List[str]],
+    jobs: int,
+    dry_run: bool,
+    force: bool,
+) -> BuildReport:
+    t_start = time.perf_counter()
+    by_name = {s.name: s for s in stages}
+    order = _select(by_name, only)
+
+    state_path = root / STATE_FILE
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        state = {}
+    nodes_state: Dict[str, dict] = state.get("stages", {})
+    hashes = _HashCache(state.get("files", {}))
+    report = BuildReport()
+    lock = threading.Lock()
+
+    def _record(stage: Stage) -> dict:
+        return {
+            "inputs": _signature(stage, root, hashes, stage.inputs),
+            "outputs": _files_signature(root, stage.outputs(root), hashes),
+        }
+
+    def execute(name: str, upstream_built: bool) -> StageResult:
+        stage = by_name[name]
+        t0 = time.perf_counter()
+        prev = nodes_state.get(name, {})
+        in_sig = _signature(stage, root, hashes, stage.inputs)
+        out_sig = _files_signature(root, stage.outputs(root), hashes)
+        up_to_date = not force and prev.get("inputs") == in_sig and prev.get("outputs") == out_sig
+        if up_to_date and not upstream_built:
+            return StageResult(name, "up-to-date", time.perf_counter() - t0)
+        if dry_run:
+            return StageResult(name, "would build", time.perf_counter() - t0)
+
+        note = stage.run(root, jobs)
+        # Firma DESPUÉS de correr (los stages in-place cambian sus propias entradas).
+        record = _record(stage)
+        with lock:
+            nodes_state[name] = record
+        return StageResult(name, "built", time.perf_counter() - t0, note)
+
+    pending = list(order)
+    running: Dict[Future, str] = {}
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        while pending or running:
+            for name in list(pending):
+                deps = by_name[name].deps
+                if any(d in pending or d in running.values() for d in deps if d in order):
+                    continue
+                pending.remove(name)
+                bad = [d for d in deps if d in report.results and report.results[d].status in ("failed", "skipped")]
+                if bad:
+                    report.results[name] = StageResult(name, "skipped", note=f"dependency {bad[0]} did not build")
+                    continue
+                # En dry-run, si una dependencia correría, este también (sus entradas cambiarían).
+                upstream = any(
+                    d in report.results and report.results[d].status in ("built", "would build") for d in deps
+                )
+                running[ex.submit(execute, name, upstream and dry_run)] = name
+            if not running:
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                try:
+                    report.results[name] = fut.result()
+                except Exception as e:  # el build sigue con los nodos independientes
+                    report.results[name] = StageResult(name, "failed", note=f"{type(e).__name__}: {e}")
+
+    if not dry_run:
+        # lqip-thumbs, lazy-images y bundle-js reescriben el mismo HTML: la firma que dejó un stage
+        # queda vieja cuando otro posterior toca sus archivos. Como son idempotentes, el estado final es un
+        # punto fijo: se re-firman todos los nodos al día para que el próximo build los saltee.
+        if any(r.status == "built" for r in report.results.values()):
+            for name in order:
+                if report.results.get(name) and report.results[name].status in ("built", "up-to-date"):
+                    nodes_state[name] = _record(by_name[name])
+        state = {"stages": nodes_state, "files": hashes.entries()}
+        write_text_if_changed(state_path, json.dumps(state, indent=1, sort_keys=True) + "\n")
+    report.files_hashed = hashes.hashed
+    report.seconds = time.perf_counter() - t_start
+    return report
+
+
+def main(argv: List[str]) -> int:
+    stages = site_stages()
+    names = [s.name for s in stages]
+
+    ap = argparse.ArgumentParser(description="Build del sitio: reconstruye solo lo que cambió, en paralelo.")
+    ap.add_argument("--root", default=".", help="Root del proyecto (default: .)")
+    ap.add_argument("--only", nargs="+", choices=names, help="Solo estos stages (+ sus dependencias)")
+    ap.add_argument("--jobs", type=int, default=4, help="Workers en paralelo (default: 4)")
+    ap.add_argument("--force", action="store_true", help="Ignorar .build-state.json y correr todo")
+    ap.add_argument("--dry-run", action="store_true", help="No ejecuta nada; muestra qué correría")
+    args = ap.parse_args(argv)
+
+    root = Path(args.root).resolve()
+    report = run_build(
+        root=root,
+        stages=stages,
+        only=args.only,
+        jobs=max(1, int(args.jobs)),
+        dry_run=bool(args.dry_run),
+        force=bool(args.force),
+    )
+
+    print("\n=== SITE BUILD SUMMARY ===")
+    for name in names:
+        r = report.results.get(name)
+        if r is None:
+            continue
+        note = f" | {r.note}" if r.note else ""
+        print(f"  {r.name:<14} {r.status:<12} {r.seconds * 1000:8.1f} ms{note}")
+    print(f"files hashed: {report.files_hashed}")
+    print(f"total: {report.seconds:.2f} s{' (dry-run)' if args.dry_run else ''}")
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
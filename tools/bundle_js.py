@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bundle_js.py
+
+Empaqueta los <script src> de cada página HTML en bundles:
+- Solo se concatenan las librerías de assets/vendor/ (chunks "vendor" nombrados por hash de
+  contenido). El prefijo común entre páginas (p.ej. smooth-scrollbar..packery) va en un chunk
+  propio que comparten todas; lo específico de cada página (lightgallery en la home) queda en
+  otro chunk o tag. Navegar entre páginas reusa la caché.
+- Los scripts del sitio quedan como tags propios (con defer si corresponde): varios tocan el
+  DOM al cargar sin chequear (scroll.js espera #scroll-inside) y en un bundle un error en uno
+  cortaría la ejecución de todos los que vienen después.
+- Respeta el ORDEN REAL de ejecución de cada página (los scripts con defer corren al final).
+- Agrega defer cuando es seguro: no hay scripts inline ni otros <script> después del bloque
+  en el <body>, y ningún archivo usa document.write / document.currentScript.
+- Scripts remotos (CDN) NO se descargan: quedan como tags propios, en su lugar.
+
+Salida reversible e idempotente:
+- Los bundles se escriben en assets/js/bundles/ (se podan los que ya no se usan).
+- Cada página queda con un bloque <!-- JS BUNDLE START ... --> ... <!-- JS BUNDLE END -->
+  que guarda los tags originales dentro del comentario: al re-ejecutar se reconstruye desde
+  ahí, y para hacer rollback basta reemplazar el bloque por esos tags.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from site_io import DEFAULT_PAGES, find_pages, local_path, replace_text, write_text_if_changed
+
+
+# -----------------------------
+# Tipos y helpers
+# -----------------------------
+
+@dataclass
+class ScriptTag:
+    text: str
+    src: str
+    start: int = 0
+    end: int = 0
+    defer: bool = False
+    fixed: bool = False  # async / type=module: se emite tal cual, corta los grupos
+    path: Optional[Path] = None  # archivo local; None si es remoto o no bundleable
+
+
+@dataclass
+class PageReport:
+    path: Path
+    scripts_before: int = 0
+    requests_after: int = 0
+    blocking_before: int = 0
+    blocking_after: int = 0
+    deferred: bool = False
+    bundles: List[str] = field(default_factory=list)
+    note: str = ""
+
+
+@dataclass
+class RunReport:
+    pages_scanned: int = 0
+    pages_changed: int = 0
+    bundles: Dict[str, str] = None
+    per_page: List[PageReport] = None
+
+
+_SCRIPT_RE = re.compile(r"<script\b([^>]*)>(.*?)</script\s*>", re.IGNORECASE | re.DOTALL)
+_SRC_RE = re.compile(r"\bsrc\s*=\s*(['\"])(.*?)\1", re.IGNORECASE)
+_TYPE_RE = re.compile(r"\btype\s*=\s*(['\"])(.*?)\1", re.IGNORECASE)
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_BODY_RE = re.compile(r"<body\b", re.IGNORECASE)
+
+_BLOCK_START = "<!-- JS BUNDLE START"
+_BLOCK_END = "<!-- JS BUNDLE END -->"
+_BLOCK_RE = re.compile(re.escape(_BLOCK_START) + r"(.*?)-->.*?" + re.escape(_BLOCK_END), re.DOTALL)
+
+# Patrones que hacen inseguro concatenar o diferir un archivo.
+_UNSAFE_JS_RE = re.compile(r"document\s*\.\s*(write|writeln|currentScript)\b")
+
+# //# sourceMappingURL=... (o /*# ... */): relativo al archivo original y con sus offsets,
+# dentro de un bundle apunta a un .map que no existe.
+_SOURCEMAP_RE = re.compile(
+    r"^[ \t]*(?://[#@][ \t]*sourceMappingURL=[^\n]*|/\*[#@][ \t]*sourceMappingURL=.*?\*/)[ \t]*$",
+    re.MULTILINE,
+)
+
+
+def _has_attr(attrs: str, name: str) -> bool:
+    return re.search(rf"(?:^|\s)(?:{name})(?:\s|=|$)", attrs, re.IGNORECASE) is not None
+
+
+def _mask_html_comments(html: str) -> str:
+    """Reemplaza comentarios HTML por espacios (mismas posiciones) para ignorar tags comentados."""
+    return _COMMENT_RE.sub(lambda m: " " * len(m.group(0)), html)
+
+
+def _parse_script_tags(html: str, *, offset: int = 0) -> List[ScriptTag]:
+    tags = []
+    for m in _SCRIPT_RE.finditer(html):
+        attrs = m.group(1)
+        sm = _SRC_RE.search(attrs)
+        tm = _TYPE_RE.search(attrs)
+        module = bool(tm and tm.group(2).strip().lower() == "module")
+        tags.append(
+            ScriptTag(
+                text=m.group(0),
+                src=sm.group(2).strip() if sm else "",
+                start=offset + m.start(),
+                end=offset + m.end(),
+                defer=_has_attr(attrs, "defer"),
+                fixed=_has_attr(attrs, "async") or module,
+            )
+        )
+    return tags
+
+
+def _with_defer(tag_text: str) -> str:
+    m = _SCRIPT_RE.match(tag_text)
+    if m and _has_attr(m.group(1), "defer"):
+        return tag_text
+    return re.sub(r"\s*>", " defer>", tag_text, count=1)
+
+
+# -----------------------------
+# Detección del bloque de scripts
+# -----------------------------
+
+def _find_script_block(html: str) -> Tuple[int, int, List[ScriptTag], List[str], bool]:
+    """
+    Devuelve (start, end, tags, comments, defer_safe) del bloque de scripts externos
+    del <body>: la primera secuencia de <script src> separados solo por espacios/comentarios.
+    Si la página ya tiene un bloque generado, los tags salen del comentario original.
+    """
+    bm = _BLOCK_RE.search(html)
+    masked = _mask_html_comments(html)
+    body = _BODY_RE.search(masked)
+    body_start = body.start() if body else 0
+
+    if bm:
+        start, end = bm.start(), bm.end()
+        original = bm.group(1)
+        tags = [t for t in _parse_script_tags(original) if t.src]
+        comments: List[str] = []
+    else:
+        tags = []
+        comments = []
+        start = end = -1
+        for t in _parse_script_tags(masked[body_start:], offset=body_start):
+            if not tags:
+                if not t.src:
+                    continue
+                start = t.start
+            else:
+                gap = html[end:t.start]
+                if not t.src or _COMMENT_RE.sub("", gap).strip():
+                    break
+                comments.extend(c.strip() for c in _COMMENT_RE.findall(gap))
+            t.text = html[t.start:t.end]
+            tags.append(t)
+            end = t.end
+
+    # Diferir es seguro solo si nada posterior del <body> depende de los scripts al parsear.
+    after = _mask_html_comments(html[end:]) if tags else ""
+    defer_safe = bool(tags) and not _SCRIPT_RE.search(after)
+    return start, end, tags, comments, defer_safe
+
+
+# -----------------------------
+# Bundles
+# -----------------------------
+
+def _bundle_content(root: Path, files: List[Path], sources: Dict[Path, str]) -> str:
+    """
+    Concatena en orden. Cada archivo va precedido de ';' para cortar ASI y para que un
+    'use strict' inicial no se vuelva directiva de todo el bundle. Se quitan los comentarios
+    sourceMappingURL de cada archivo (el map no corresponde al bundle).
+    """
+    parts = ["/*! AUTO-GENERATED by tools/bundle_js.py — do not edit manually. */\n"]
+    for f in files:
+        parts.append(f";/* ── source: {f.relative_to(root).as_posix()} ── */\n")
+        parts.append(_SOURCEMAP_RE.sub("", sources[f]).rstrip() + "\n")
+    return "".join(parts)
+
+
+def _group_key(root: Path, t: ScriptTag, defer_safe: bool) -> Optional[Tuple[str, bool]]:
+    """
+    (rol, diferido) de un tag bundleable; None si va suelto: remoto, async, module o script
+    del sitio (cada uno en su propio <script>, así un error no frena a los demás).
+    """
+    if t.path is None or t.fixed or "vendor" not in t.path.relative_to(root).parts:
+        return None
+    return ("vendor", defer_safe or t.defer)
+
+
+def _page_groups(
+    *,
+    root: Path,
+    page: Path,
+    tags: List[ScriptTag],
+    defer_safe: bool,
+    sources: Dict[Path, str],
+) -> Tuple[List[List[ScriptTag]], bool]:
+    """Agrupa los tags en orden de ejecución. Devuelve (grupos, defer_safe)."""
+    for t in tags:
+        p = local_path(root, page, t.src)
+        if p is None:
+            continue
+        if p not in sources:
+            sources[p] = p.read_text(encoding="utf-8", errors="ignore")
+        if _UNSAFE_JS_RE.search(sources[p]):
+            defer_safe = False
+        else:
+            t.path = p
+
+    # Orden de ejecución: bloqueantes en orden, luego los defer en orden.
+    if defer_safe:
+        order = [t for t in tags if not t.defer and not t.fixed] + [t for t in tags if t.defer or t.fixed]
+    else:
+        order = list(tags)
+
+    # Grupos de archivos locales consecutivos con la misma forma de carga y el mismo rol.
+    groups: List[List[ScriptTag]] = []
+    for t in order:
+        k = _group_key(root, t, defer_safe)
+        if groups and k is not None and _group_key(root, groups[-1][-1], defer_safe) == k:
+            groups[-1].append(t)
+        else:
+            groups.append([t])
+    return groups, defer_safe
+
+
+def _split_shared_prefixes(
+    root: Path,
+    pages: List[Tuple[Path, List[List[ScriptTag]], bool]],
+    sources: Dict[Path, str],
+) -> None:
+    """
+    Parte los grupos para que el código común entre páginas quede en el MISMO chunk.
+    Grupos de páginas distintas del mismo rol que empiezan con el mismo archivo se cortan en
+    su prefijo común (>= 2 archivos); el resto queda como chunk propio de la página. Se repite
+    sobre los restos hasta que no haya más cortes. Nunca cambia el orden de ejecución.
+    Los archivos se comparan por contenido: copias idénticas (testimonials/assets/vendor) usan
+    el mismo path en el chunk, así el bundle sale byte a byte igual.
+    """
+    digests = {p: hashlib.sha1(text.encode("utf-8")).hexdigest() for p, text in sources.items()}
+    changed = True
+    while changed:
+        changed = False
+        clusters: Dict[Tuple[str, str], List[List[ScriptTag]]] = {}
+        owners: Dict[Tuple[str, str], set] = {}
+        for page, groups, defer_safe in pages:
+            for g in groups:
+                k = _group_key(root, g[0], defer_safe)
+                if k is None or len(g) < 2:
+                    continue
+                ck = (k[0], digests[g[0].path])
+                clusters.setdefault(ck, []).append(g)
+                owners.setdefault(ck, set()).add(page)
+
+        cuts: Dict[int, int] = {}
+        for ck, gs in clusters.items():
+            if len(owners[ck]) < 2:
+                continue
+            n = min(len(g) for g in gs)
+            for i in range(1, n):
+                if any(digests[g[i].path] != digests[gs[0][i].path] for g in gs):
+                    n = i
+                    break
+            if n < 2:
+                continue
+            for g in gs:
+                for i in range(n):
+                    g[i].path = gs[0][i].path
+                if len(g) > n:
+                    cuts[id(g)] = n
+
+        for _, groups, _ in pages:
+            out = []
+            for g in groups:
+                n = cuts.get(id(g))
+                out.extend([g[:n], g[n:]] if n else [g])
+            if len(out) != len(groups):
+                groups[:] = out
+                changed = True
+
+
+def _plan_page(
+    *,
+    root: Path,
+    page: Path,
+    tags: List[ScriptTag],
+    groups: List[List[ScriptTag]],
+    defer_safe: bool,
+    out_dir: Path,
+    sources: Dict[Path, str],
+    bundles: Dict[str, str],
+    rep: PageReport,
+) -> List[str]:
+    """Devuelve las líneas <script> que reemplazan al bloque original (y registra bundles)."""
+    lines = []
+    for g in groups:
+        deferred = defer_safe or g[0].defer
+        if len(g) == 1:
+            t = g[0]
+            lines.append(_with_defer(t.text) if deferred and not t.fixed else t.text)
+            continue
+        content = _bundle_content(root, [t.path for t in g], sources)
+        role = _group_key(root, g[0], defer_safe)[0]
+        name = f"{role}.{hashlib.sha1(content.encode('utf-8')).hexdigest()[:10]}.js"
+        bundles[name] = content
+        rep.bundles.append(name)
+        href = Path(os.path.relpath(out_dir / name, page.parent)).as_posix()
+        lines.append(f'<script src="{href}"{" defer" if deferred else ""}></script>')
+
+    rep.scripts_before = len(tags)
+    rep.blocking_before = sum(1 for t in tags if not t.defer and not t.fixed)
+    rep.requests_after = len(lines)
+    rep.blocking_after = sum(1 for line in lines if not _has_attr(_SCRIPT_RE.match(line).group(1), "defer|async"))
+    rep.deferred = defer_safe
+    return lines
+
+
+def _render_block(tags: List[ScriptTag], lines: List[str], ind: str) -> str:
+    out = [f"{_BLOCK_START} (auto-generated by tools/bundle_js.py). Original tags:"]
+    out.extend(f"{ind}  {t.text}" for t in tags)
+    out.append(f"{ind}-->")
+    out.extend(f"{ind}{line}" for line in lines)
+    out.append(f"{ind}{_BLOCK_END}")
+    return "\n".join(out)
+
+
+@dataclass
+class _PageScan:
+    page: Path
+    html: str
+    start: int
+    end: int
+    tags: List[ScriptTag]
+    comments: List[str]
+    defer_safe: bool
+    groups: List[List[ScriptTag]]
+    rep: PageReport
+
+
+def _scan_page_scripts(page: Path, *, root: Path, sources: Dict[Path, str], rep: PageReport) -> Optional[_PageScan]:
+    """Bloque de scripts de la página y sus grupos; None si no hay nada que bundlear."""
+    html = page.read_text(encoding="utf-8", errors="ignore")
+    start, end, tags, comments, defer_safe = _find_script_block(html)
+    if not tags:
+        rep.note = "no <script src> block in <body>"
+        return None
+    if any("--" in t.text for t in tags):
+        rep.note = "script tag contains '--' (cannot be kept inside the HTML comment)"
+        return None
+    groups, defer_safe = _page_groups(root=root, page=page, tags=tags, defer_safe=defer_safe, sources=sources)
+    return _PageScan(page, html, start, end, tags, comments, defer_safe, groups, rep)
+
+
+def _patch_html_scripts(
+    scan: _PageScan,
+    *,
+    root: Path,
+    out_dir: Path,
+    sources: Dict[Path, str],
+    bundles: Dict[str, str],
+    dry_run: bool,
+    backup: bool,
+) -> Tuple[bool, Optional[Path]]:
+    """Reemplaza el bloque de scripts de la página por el bloque generado (solo si cambia)."""
+    page, html, start, end, rep = scan.page, scan.html, scan.start, scan.end, scan.rep
+    lines = _plan_page(
+        root=root,
+        page=page,
+        tags=scan.tags,
+        groups=scan.groups,
+        defer_safe=scan.defer_safe,
+        out_dir=out_dir,
+        sources=sources,
+        bundles=bundles,
+        rep=rep,
+    )
+    if not scan.defer_safe:
+        rep.note = "inline/other <script> after the block: kept blocking"
+
+    line_start = html.rfind("\n", 0, start) + 1
+    ind = re.match(r"[ \t]*", html[line_start:start]).group(0)
+    block = _render_block(scan.tags, lines, ind)
+    # Los comentarios que había entre tags (p.ej. scripts comentados) quedan antes del bloque.
+    prefix = "".join(f"{c}\n{ind}" for c in scan.comments)
+    new_html = html[:start] + prefix + block + html[end:]
+
+    if new_html == html:
+        return False, None
+    if dry_run:
+        return True, None
+
+    bak_path = None
+    if backup:
+        bak_path = page.with_suffix(page.suffix + ".bak")
+        bak_path.write_text(html, encoding="utf-8")
+    replace_text(page, new_html)
+    return True, bak_path
+
+
+def bundle_site(
+    *,
+    root: Path,
+    pages: List[Path],
+    out_dir: Path,
+    dry_run: bool,
+    backup: bool,
+) -> RunReport:
+    """Planifica bundles para todas las páginas y (si no es dry-run) parchea el HTML."""
+    sources: Dict[Path, str] = {}
+    report = RunReport(bundles={}, per_page=[])
+    scans = []
+    for page in pages:
+        rep = PageReport(path=page)
+        report.per_page.append(rep)
+        scan = _scan_page_scripts(page, root=root, sources=sources, rep=rep)
+        if scan is not None:
+            scans.append(scan)
+
+    # Chunks vendor compartidos entre páginas (librerías comunes => un solo archivo en caché).
+    _split_shared_prefixes(root, [(s.page, s.groups, s.defer_safe) for s in scans], sources)
+
+    for scan in scans:
+        changed, _ = _patch_html_scripts(
+            scan,
+            root=root,
+            out_dir=out_dir,
+            sources=sources,
+            bundles=report.bundles,
+            dry_run=dry_run,
+            backup=backup,
+        )
+        report.pages_changed += int(changed)
+    report.pages_scanned = len(pages)
+    return report
+
+
+def write_bundles(out_dir: Path, bundles: Dict[str, str], *, prune: bool) -> Tuple[int, int]:
+    """Escribe bundles nuevos/cambiados y poda los que ya no referencia ninguna página."""
+    written = 0
+    for name, content in sorted(bundles.items()):
+        wrote, _ = write_text_if_changed(out_dir / name, content)
+        written += int(wrote)
+    removed = 0
+    if prune and out_dir.exists():
+        for p in out_dir.glob("*.js"):
+            if p.name not in bundles:
+                p.unlink()
+                removed += 1
+    return written, removed
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description="Empaqueta las librerías vendor de cada página en bundles y difiere los <script src>.")
+
+    ap.add_argument("--root", default=".", help="Root del proyecto (default: .)")
+    ap.add_argument(
+        "--pages",
+        nargs="+",
+        default=DEFAULT_PAGES,
+        help="Globs de páginas HTML relativos a root",
+    )
+    ap.add_argument("--out-dir", default="assets/js/bundles", help="Carpeta de bundles (default: assets/js/bundles)")
+    ap.add_argument("--no-prune", action="store_true", help="No borrar bundles viejos no referenciados")
+
+    ap.add_argument("--dry-run", action="store_true", help="No escribe archivos; solo reporte")
+    ap.add_argument("--apply", action="store_true", help="Escribe bundles y parchea HTML si cambió")
+    ap.add_argument("--backup", action="store_true", help="Crea .bak (sin timestamp) al sobrescribir HTML")
+    args = ap.parse_args(argv)
+
+    root = Path(args.root).resolve()
+    out_dir = (root / args.out_dir).resolve()
+    pages = find_pages(root, args.pages)
+    if not pages:
+        print(f"ERROR: no hay páginas HTML para: {' '.join(args.pages)}")
+        return 2
+
+    write = args.apply and not args.dry_run
+    report = bundle_site(root=root, pages=pages, out_dir=out_dir, dry_run=not write, backup=bool(args.backup))
+
+    print("\n=== JS BUNDLE REPORT ===")
+    print(f"pages scanned: {report.pages_scanned}")
+    print(f"pages {'patched' if write else 'to patch'}: {report.pages_changed}")
+    print(f"bundles: {len(report.bundles)} ({sum(len(c.encode('utf-8')) for c in report.bundles.values())} bytes)")
+    for rep in report.per_page:
+        rel = rep.path.relative_to(root).as_posix()
+        print(
+            f"  - {rel}: {rep.scripts_before} -> {rep.requests_after} requests | "
+            f"blocking {rep.blocking_before} -> {rep.blocking_after}"
+            + (f" | {', '.join(rep.bundles)}" if rep.bundles else "")
+            + (f" | NOTE: {rep.note}" if rep.note else "")
+        )
+
+    if args.dry_run:
+        print("\n(Dry-run) Nothing written.")
+        return 0
+
+    if not args.apply:
+        print("\nNothing written (pass --apply to write).")
+        return 0
+
+    written, removed = write_bundles(out_dir, report.bundles, prune=not args.no_prune)
+    print(f"\nOK: bundles written={written} pruned={removed} in {out_dir.relative_to(root).as_posix()}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
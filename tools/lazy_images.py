@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+lazy_images.py
+
+Reescribe los <img> de todas las páginas HTML:
+- Agrega width/height intrínsecos leídos de la CABECERA del archivo (JPEG SOF + orientación
+  EXIF, PNG IHDR, GIF, SVG width/height/viewBox), sin decodificar píxeles. Reserva el
+  espacio antes de la descarga (theme.css ya tiene img { height: auto }).
+- Agrega loading="lazy" y decoding="async" a las imágenes de contenido que no están entre
+  las primeras N (las primeras quedan eager: suelen estar arriba del fold). No cuentan para N:
+  - las de navegación/logos (header, nav, #logo-header, .nav-work): quedan eager;
+  - las repetidas (mismo archivo que un <img> anterior): heredan la decisión del primero.
+  La primera imagen raster de contenido (jpg/png/webp/...) nunca es lazy: suele ser el LCP
+  (p.ej. el hero de cada work/*), aunque la precedan SVG decorativos.
+- NO agrega loading="lazy" dentro de contenedores que esperan imagesLoaded antes de
+  maquetar (isotope: #gallery, .isotope-items-wrap); ahí solo width/height/decoding.
+- Nunca pisa atributos existentes: idempotente.
+
+Fases: 1) parsear todas las páginas, 2) leer cabeceras en paralelo (una vez por archivo),
+3) reescribir cada página.
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from site_io import DEFAULT_PAGES, find_pages, local_path, write_with_backup_if_changed
+
+
+# -----------------------------
+# Tipos y helpers
+# -----------------------------
+
+# Contenedores que esperan imagesLoaded antes de maquetar (isotope): sin loading="lazy".
+DEFAULT_KEEP_EAGER_IN = ["#gallery", ".isotope-items-wrap"]
+
+# Navegación y logos (incluye copias ocultas del menú overlay y las flechas de .nav-work):
+# eager y fuera del conteo de --eager.
+DEFAULT_CHROME_IN = ["header", "nav", "#logo-header", ".nav-work"]
+
+_RASTER_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".avif", ".gif"}
+
+
+@dataclass
+class ImgTag:
+    start: int
+    end: int
+    text: str
+    attrs: Dict[str, Optional[str]]
+    keep_eager: bool = False  # dentro de un contenedor que espera imagesLoaded
+    chrome: bool = False  # dentro de navegación/logos
+    path: Optional[Path] = None
+
+
+@dataclass
+class PageReport:
+    path: Path
+    imgs: int = 0
+    sized: int = 0
+    lazy: int = 0
+    eager_kept: int = 0
+    chrome: int = 0
+    unsized: List[str] = field(default_factory=list)
+
+
+@dataclass
+class RunReport:
+    pages_scanned: int = 0
+    pages_changed: int = 0
+    images_read: int = 0
+    per_page: List[PageReport] = None
+
+
+# -----------------------------
+# Dimensiones desde cabeceras
+# -----------------------------
+
+_SVG_UNITS_TO_PX = {
+    "": 1.0,
+    "px": 1.0,
+    "in": 96.0,
+    "cm": 96.0 / 2.54,
+    "mm": 96.0 / 25.4,
+    "pt": 96.0 / 72.0,
+    "pc": 16.0,
+}
+
+# SOF0..SOF15 salvo DHT (C4), JPG (C8) y DAC (CC).
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _exif_orientation(app1: bytes) -> int:
+    """Orientación EXIF (tag 0x0112 del IFD0) de un segmento APP1; 1 si no hay."""
+    if not app1.startswith(b"Exif\x00\x00") or len(app1) < 14:
+        return 1
+    tiff = app1[6:]
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None:
+        return 1
+    (ifd,) = struct.unpack(endian + "I", tiff[4:8])
+    if ifd + 2 > len(tiff):
+        return 1
+    (count,) = struct.unpack(endian + "H", tiff[ifd:ifd + 2])
+    for i in range(count):
+        entry = tiff[ifd + 2 + i * 12: ifd + 14 + i * 12]
+        if len(entry) < 12:
+            break
+        tag, _typ, _n, value = struct.unpack(endian + "HHIH", entry[:10])
+        if tag == 0x0112:
+            return value
+    return 1
+
+
+def _jpeg_size(f) -> Optional[Tuple[int, int]]:
+    """Recorre los segmentos hasta el SOF (saltando datos con seek). Aplica orientación EXIF."""
+    f.seek(2)
+    orientation = 1
+    while True:
+        b = f.read(1)
+        while b and b != b"\xff":
+            b = f.read(1)
+        while b == b"\xff":
+            b = f.read(1)
+        if not b:
+            return None
+        marker = b[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker == 0xD9:
+            return None
+        head = f.read(2)
+        if len(head) < 2:
+            return None
+        (length,) = struct.unpack(">H", head)
+        if marker in _JPEG_SOF:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            return width, height
+        if marker == 0xE1 and orientation == 1:
+            orientation = _exif_orientation(f.read(length - 2))
+            continue
+        f.seek(length - 2, 1)
+
+
+def _svg_length(value: Optional[str]) -> Optional[float]:
+    m = re.fullmatch(r"\s*([0-9]*\.?[0-9]+(?:e[+-]?[0-9]+)?)\s*([a-z]*)\s*", value or "", re.IGNORECASE)
+    if not m:
+        return None
+    factor = _SVG_UNITS_TO_PX.get(m.group(2).lower())
+    return None if factor is None else float(m.group(1)) * factor
+
+
+def _svg_size(head: bytes) -> Optional[Tuple[int, int]]:
+    """width/height absolutos del <svg>; si falta uno, se completa con la proporción del viewBox."""
+    m = re.search(rb"<svg\b[^>]*>", head, re.IGNORECASE | re.DOTALL)
+    if not m:
+        return None
+    tag = m.group(0).decode("utf-8", errors="ignore")
+
+    def attr(name: str) -> Optional[str]:
+        am = re.search(rf"\s{name}\s*=\s*(['\"])(.*?)\1", tag, re.IGNORECASE)
+        return am.group(2) if am else None
+
+    w, h = _svg_length(attr("width")), _svg_length(attr("height"))
+    vb = [float(x) for x in re.findall(r"-?[0-9]*\.?[0-9]+", attr("viewBox") or "")]
+    ratio = vb[2] / vb[3] if len(vb) == 4 and vb[2] > 0 and vb[3] > 0 else None
+    if w is None and h is not None and ratio:
+        w = h * ratio
+    elif h is None and w is not None and ratio:
+        h = w / ratio
+    # Sin width/height absolutos el tamaño intrínseco del <img> no está definido:
+    # inventarlo desde el viewBox cambiaría el render, así que no lo agregamos.
+    if not w or not h:
+        return None
+    return round(w), round(h)
+
+
+def _image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """(width, height) leyendo solo la cabecera; None si no se puede determinar."""
+    try:
+        with path.open("rb") as f:
+            head = f.read(32)
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head.startswith(b"\xff\xd8"):
+                return _jpeg_size(f)
+            if path.suffix.lower() == ".svg":
+                return _svg_size(head + f.read(4096))
+    except (OSError, struct.error):
+        return None
+    return None
+
+
+# -----------------------------
+# Parseo HTML (posiciones + ancestros)
+# -----------------------------
+
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+
+def _matches(selector: str, tag: str, attrs: Dict[str, Optional[str]]) -> bool:
+    """Selectores simples: #id, .class o nombre de tag."""
+    if selector.startswith("#"):
+        return attrs.get("id") == selector[1:]
+    if selector.startswith("."):
+        return selector[1:] in (attrs.get("class") or "").split()
+    return selector.lower() == tag
+
+
+class _ImgScanner(HTMLParser):
+    """Junta los <img> del <body> con su posición y si están dentro de un contenedor excluido."""
+
+    def __init__(self, html: str, keep_eager_in: Sequence[str], chrome_in: Sequence[str]) -> None:
+        super().__init__(convert_charrefs=True)
+        self.html = html
+        self.keep_eager_in = keep_eager_in
+        self.chrome_in = chrome_in
+        self.line_starts = [0] + [m.end() for m in re.finditer(r"\n", html)]
+        self.stack: List[Tuple[str, bool, bool]] = []  # (tag, excluded, chrome)
+        self.in_body = False
+        self.skip_depth = 0  # <template>/<noscript>
+        self.imgs: List[ImgTag] = []
+
+    def _offset(self) -> int:
+        line, col = self.getpos()
+        return self.line_starts[line - 1] + col
+
+    def _excluded(self) -> bool:
+        return bool(self.stack) and self.stack[-1][1]
+
+    def _chrome(self) -> bool:
+        return bool(self.stack) and self.stack[-1][2]
+
+    def handle_starttag(self, tag, attrs):
+        d = dict(attrs)
+        if tag == "body":
+            self.in_body = True
+        if tag == "img":
+            self._img(d)
+            return
+        if tag in _VOID_TAGS:
+            return
+        if tag in ("template", "noscript"):
+            self.skip_depth += 1
+        excluded = self._excluded() or any(_matches(sel, tag, d) for sel in self.keep_eager_in)
+        chrome = self._chrome() or any(_matches(sel, tag, d) for sel in self.chrome_in)
+        self.stack.append((tag, excluded, chrome))
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "img":
+            self._img(dict(attrs))
+
+    def handle_endtag(self, tag):
+        if tag in ("template", "noscript") and self.skip_depth:
+            self.skip_depth -= 1
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i:]
+                break
+
+    def _img(self, attrs: Dict[str, Optional[str]]) -> None:
+        if not self.in_body or self.skip_depth:
+            return
+        start = self._offset()
+        text = self.get_starttag_text()
+        self.imgs.append(
+            ImgTag(
+                start=start,
+                end=start + len(text),
+                text=text,
+                attrs=attrs,
+                keep_eager=self._excluded(),
+                chrome=self._chrome(),
+            )
+        )
+
+
+def scan_page(
+    root: Path,
+    page: Path,
+    keep_eager_in: Sequence[str],
+    chrome_in: Sequence[str] = (),
+) -> Tuple[str, List[ImgTag]]:
+    html = page.read_text(encoding="utf-8", errors="ignore")
+    scanner = _ImgScanner(html, keep_eager_in, chrome_in)
+    scanner.feed(html)
+    scanner.close()
+    for img in scanner.imgs:
+        img.path = local_path(root, page, img.attrs.get("src"))
+    return html, scanner.imgs
+
+
+# -----------------------------
+# Reescritura
+# -----------------------------
+
+def _rewrite_img(img: ImgTag, size: Optional[Tuple[int, int]], *, lazy: bool) -> str:
+    add = []
+    if size and "width" not in img.attrs and "height" not in img.attrs:
+        add.append(f'width="{size[0]}" height="{size[1]}"')
+    if lazy and "loading" not in img.attrs:
+        add.append('loading="lazy"')
+    if "decoding" not in img.attrs and (lazy or img.keep_eager):
+        add.append('decoding="async"')
+    if not add:
+        return img.text
+    m = re.search(r"\s*/?>$", img.text)
+    return img.text[:m.start()] + " " + " ".join(add) + img.text[m.start():]
+
+
+def lazy_images_site(
+    *,
+    root: Path,
+    pages: List[Path],
+    eager: int,
+    keep_eager_in: List[str],
+    chrome_in: List[str],
+    workers: int,
+    dry_run: bool,
+    backup: bool,
+) -> RunReport:
+    report = RunReport(per_page=[])
+
+    scanned = [(page, *scan_page(root, page, keep_eager_in, chrome_in)) for page in pages]
+    paths = sorted({img.path for _, _, imgs in scanned for img in imgs if img.path is not None})
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        sizes: Dict[Path, Optional[Tuple[int, int]]] = dict(zip(paths, ex.map(_image_size, paths)))
+    report.images_read = len(paths)
+
+    for page, html, imgs in scanned:
+        rep = PageReport(path=page, imgs=len(imgs))
+        parts = []
+        last = 0
+        counted = 0
+        first_raster = True
+        decided: Dict[object, bool] = {}  # archivo (o src) -> lazy del primer <img> que lo usa
+        for img in imgs:
+            size = sizes.get(img.path) if img.path is not None else None
+            src_key = img.path or img.attrs.get("src")
+            if img.keep_eager or img.chrome:
+                lazy = False
+            elif src_key in decided:
+                lazy = decided[src_key]
+            else:
+                lazy = counted >= eager
+                counted += 1
+                if first_raster and img.path is not None and img.path.suffix.lower() in _RASTER_EXTS:
+                    first_raster = False
+                    lazy = False
+                decided[src_key] = lazy
+            new = _rewrite_img(img, size, lazy=lazy)
+            if size or "width" in img.attrs:
+                rep.sized += 1
+            else:
+                rep.unsized.append(img.attrs.get("src") or "")
+            if lazy or img.attrs.get("loading") == "lazy":
+                rep.lazy += 1
+            elif img.keep_eager:
+                rep.eager_kept += 1
+            elif img.chrome:
+                rep.chrome += 1
+            parts.append(html[last:img.start])
+            parts.append(new)
+            last = img.end
+        parts.append(html[last:])
+        new_html = "".join(parts)
+
+        report.pages_scanned += 1
+        report.per_page.append(rep)
+        if new_html == html:
+            continue
+        report.pages_changed += 1
+        if not dry_run:
+            write_with_backup_if_changed(page, new_html, backup=backup)
+
+    return report
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description="Agrega width/height, loading=lazy y decoding=async a los <img> del sitio.")
+
+    ap.add_argument("--root", default=".", help="Root del proyecto (default: .)")
+    ap.add_argument(
+        "--pages",
+        nargs="+",
+        default=DEFAULT_PAGES,
+        help="Globs de páginas HTML relativos a root",
+    )
+    ap.add_argument(
+        "--eager",
+        type=int,
+        default=4,
+        help="Primeros <img> de contenido (sin navegación ni repetidos) que quedan eager (default: 4)",
+    )
+    ap.add_argument(
+        "--keep-eager-in",
+        nargs="*",
+        default=DEFAULT_KEEP_EAGER_IN,
+        help="Contenedores (#id/.class) cuyos <img> no se hacen lazy (imagesLoaded + isotope)",
+    )
+    ap.add_argument(
+        "--chrome-in",
+        nargs="*",
+        default=DEFAULT_CHROME_IN,
+        help="Contenedores de navegación/logos (tag/#id/.class): eager y fuera del conteo de --eager",
+    )
+    ap.add_argument("--workers", type=int, default=8, help="Hilos para leer cabeceras (default: 8)")
+
+    ap.add_argument("--dry-run", action="store_true", help="No escribe archivos; solo reporte")
+    ap.add_argument("--apply", action="store_true", help="Reescribe el HTML si cambió")
+    ap.add_argument("--backup", action="store_true", help="Crea .bak (sin timestamp) al sobrescribir")
+    args = ap.parse_args(argv)
+
+    root = Path(args.root).resolve()
+    pages = find_pages(root, args.pages)
+    if not pages:
+        print(f"ERROR: no hay páginas HTML para: {' '.join(args.pages)}")
+        return 2
+
+    write = args.apply and not args.dry_run
+    report = lazy_images_site(
+        root=root,
+        pages=pages,
+        eager=max(0, int(args.eager)),
+        keep_eager_in=list(args.keep_eager_in),
+        chrome_in=list(args.chrome_in),
+        workers=max(1, int(args.workers)),
+        dry_run=not write,
+        backup=bool(args.backup),
+    )
+
+    print("\n=== LAZY IMAGES REPORT ===")
+    print(f"pages scanned: {report.pages_scanned}")
+    print(f"pages {'rewritten' if write else 'to rewrite'}: {report.pages_changed}")
+    print(f"image headers read: {report.images_read}")
+    for rep in report.per_page:
+        rel = rep.path.relative_to(root).as_posix()
+        print(
+            f"  - {rel}: {rep.imgs} img | sized {rep.sized} | lazy {rep.lazy} | "
+            f"eager (imagesLoaded) {rep.eager_kept} | nav/logos {rep.chrome} | unsized {len(rep.unsized)}"
+        )
+        for src in rep.unsized[:5]:
+            print(f"      · no intrinsic size: {src}")
+
+    if args.dry_run:
+        print("\n(Dry-run) Nothing written.")
+        return 0
+
+    if not args.apply:
+        print("\nNothing written (pass --apply to write).")
+        return 0
+
+    print(f"\nOK: {report.pages_changed} page(s) rewritten.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
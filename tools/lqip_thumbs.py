@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+lqip_thumbs.py
+
+Placeholders (LQIP) y color dominante para las miniaturas de la galería de la home
+(assets/home: base + variante hover "-b"):
+- Por cada imagen: JPEG diminuto difuminado como data URI + color dominante (cuantización
+  median-cut). Se calculan en un pool de procesos y se cachean por hash del contenido
+  (.lqip-cache.json), así solo se recalculan las imágenes que cambiaron.
+- <img class="img-base">: se agrega style con color + placeholder de fondo, la grilla pinta
+  en cuanto llega el HTML.
+- <img class="img-hover">: el src pasa a ser el placeholder y la imagen real queda en
+  data-src; assets/js/hover-images.js la carga en el primer hover/foco de la card.
+- A ambas se les agregan width/height intrínsecos si no tienen: sin ellos la base mide 0x0
+  hasta que baja la imagen (y el placeholder no se ve), y lazy_images no puede leerlos del data URI.
+- Reporta cuánto peso de imágenes sale de la carga inicial.
+
+Cada <img> tocado lleva data-lqip=<hash>: si la imagen no cambió, no se reescribe (idempotente).
+
+Uso:
+  python tools/lqip_thumbs.py [--root .] [--dry-run | --apply] [--workers 4]
+
+Requiere Pillow (tools/requirements.txt).
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import html as html_lib
+import io
+import json
+import multiprocessing
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageFilter, ImageOps
+
+from lazy_images import ImgTag, scan_page
+from site_io import local_path, write_text_if_changed, write_with_backup_if_changed
+
+
+# -----------------------------
+# Tipos y helpers
+# -----------------------------
+
+CACHE_FILE = ".lqip-cache.json"
+DEFAULT_PAGE = "index.html"
+DEFAULT_IMAGES_DIR = "assets/home"
+HOVER_CLASS = "img-hover"
+
+# Parámetros del placeholder: si cambian, el cache se invalida.
+LQIP_SIZE = 24  # px del lado mayor
+LQIP_BLUR = 1.0
+LQIP_QUALITY = 45
+LQIP_PARAMS = f"v1:{LQIP_SIZE}:{LQIP_BLUR}:{LQIP_QUALITY}"
+
+
+@dataclass
+class Placeholder:
+    width: int
+    height: int
+    color: str  # #rrggbb
+    data_uri: str
+
+    @property
+    def key(self) -> str:
+        """Hash corto del placeholder: va en data-lqip para detectar cambios."""
+        return hashlib.sha1(f"{self.width}x{self.height}{self.color}{self.data_uri}".encode("ascii")).hexdigest()[:10]
+
+
+@dataclass
+class RunReport:
+    images: int = 0
+    computed: int = 0  # cache miss
+    imgs_patched: int = 0
+    hover_deferred: int = 0
+    bytes_deferred: int = 0  # variantes hover que ya no se descargan al cargar
+    bytes_inlined: int = 0  # placeholders agregados al HTML
+    bytes_thumbs: int = 0  # peso total de las miniaturas (base + hover)
+    page_changed: bool = False
+    skipped: List[str] = field(default_factory=list)
+
+
+def _placeholder_for(path: str) -> Tuple[int, int, str, str]:
+    """(ancho, alto, color, data URI). Corre en un proceso del pool."""
+    with Image.open(path) as im:
+        im = ImageOps.exif_transpose(im).convert("RGB")
+        width, height = im.size
+
+        # Color dominante: el más frecuente tras cuantizar a pocos colores (ignora ruido/bordes finos).
+        small = im.resize((64, 64), Image.Resampling.BILINEAR)
+        quant = small.quantize(colors=5, method=Image.Quantize.MEDIANCUT)
+        _, idx = max(quant.getcolors())
+        r, g, b = quant.getpalette()[idx * 3:idx * 3 + 3]
+
+        tiny = im.copy()
+        tiny.thumbnail((LQIP_SIZE, LQIP_SIZE), Image.Resampling.LANCZOS)
+        tiny = tiny.filter(ImageFilter.GaussianBlur(LQIP_BLUR))
+        buf = io.BytesIO()
+        tiny.save(buf, "JPEG", quality=LQIP_QUALITY, optimize=True)
+
+    uri = "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+    return width, height, f"#{r:02x}{g:02x}{b:02x}", uri
+
+
+def _load_cache(path: Path) -> Dict[str, list]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data.get("entries", {}) if data.get("params") == LQIP_PARAMS else {}
+
+
+def compute_placeholders(
+    root: Path,
+    paths: List[Path],
+    *,
+    workers: int,
+    save_cache: bool = True,
+) -> Tuple[Dict[Path, Placeholder], int]:
+    """Placeholders por imagen, reusando .lqip-cache.json. Devuelve (placeholders, calculados)."""
+    cache_path = root / CACHE_FILE
+    cache = _load_cache(cache_path)
+    digests = {p: hashlib.sha1(p.read_bytes()).hexdigest() for p in paths}
+    missing = sorted({p for p in paths if digests[p] not in cache})
+
+    if missing:
+        # spawn: el build corre stages en hilos; fork con hilos vivos no es seguro.
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, len(missing))), mp_context=ctx) as ex:
+            for p, result in zip(missing, ex.map(_placeholder_for, [str(p) for p in missing])):
+                cache[digests[p]] = list(result)
+
+    used = {digests[p]: cache[digests[p]] for p in paths}
+    if save_cache:
+        state = {"params": LQIP_PARAMS, "entries": used}
+        write_text_if_changed(cache_path, json.dumps(state, indent=1, sort_keys=True) + "\n")
+    return {p: Placeholder(*used[digests[p]]) for p in paths}, len(missing)
+
+
+# -----------------------------
+# Reescritura del HTML
+# -----------------------------
+
+def _set_attrs(tag: str, values: Dict[str, str]) -> str:
+    """Reemplaza (o agrega al final) atributos de un start tag."""
+    for name, value in values.items():
+        quoted = f'{name}="{html_lib.escape(value, quote=True)}"'
+        pattern = re.compile(
+            rf"(\s){re.escape(name)}(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'>]+))?(?=[\s/>])",
+            re.IGNORECASE,
+        )
+        if pattern.search(tag):
+            tag = pattern.sub(lambda m: m.group(1) + quoted, tag, count=1)
+        else:
+            m = re.search(r"\s*/?>$", tag)
+            tag = tag[:m.start()] + " " + quoted + tag[m.start():]
+    return tag
+
+
+def _patch_img(img: ImgTag, ph: Placeholder, *, hover: bool) -> Optional[str]:
+    """Nuevo texto del <img>, o None si no corresponde tocarlo (style propio)."""
+    attrs = img.attrs
+    if "style" in attrs and "data-lqip" not in attrs:
+        return None
+
+    values = {"data-lqip": ph.key}
+    if hover:
+        real = attrs.get("data-src") or attrs.get("src") or ""
+        values.update({"src": ph.data_uri, "data-src": real})
+    else:
+        values["style"] = f"background:{ph.color} url({ph.data_uri}) center/cover no-repeat"
+    # Sin tamaño intrínseco el <img> mide 0x0 hasta que llega la imagen y el fondo no se ve.
+    if "width" not in attrs and "height" not in attrs:
+        values.update({"width": str(ph.width), "height": str(ph.height)})
+    return _set_attrs(img.text, values)
+
+
+def lqip_page(
+    *,
+    root: Path,
+    page: Path,
+    images_dir: Path,
+    workers: int,
+    dry_run: bool,
+    backup: bool,
+) -> RunReport:
+    report = RunReport()
+    html, imgs = scan_page(root, page, [])
+
+    targets: List[Tuple[ImgTag, Path, bool]] = []
+    for img in imgs:
+        hover = HOVER_CLASS in (img.attrs.get("class") or "").split()
+        path = local_path(root, page, img.attrs.get("data-src")) if hover and img.attrs.get("data-src") else img.path
+        if path is not None and images_dir in path.parents:
+            targets.append((img, path, hover))
+
+    paths = sorted({p for _, p, _ in targets})
+    placeholders, report.computed = compute_placeholders(root, paths, workers=workers, save_cache=not dry_run)
+    report.images = len(paths)
+    report.bytes_thumbs = sum(p.stat().st_size for p in paths)
+
+    parts = []
+    last = 0
+    for img, path, hover in targets:
+        ph = placeholders[path]
+        new = _patch_img(img, ph, hover=hover)
+        if new is None:
+            report.skipped.append(img.attrs.get("src") or "")
+            continue
+        # Peso que el placeholder suma al HTML (una vez por <img>).
+        report.bytes_inlined += len(ph.data_uri) + (0 if hover else len(ph.color))
+        if hover:
+            report.hover_deferred += 1
+            report.bytes_deferred += path.stat().st_size
+        if new != img.text:
+            report.imgs_patched += 1
+        parts.append(html[last:img.start])
+        parts.append(new)
+        last = img.end
+    parts.append(html[last:])
+    new_html = "".join(parts)
+
+    report.page_changed = new_html != html
+    if report.page_changed and not dry_run:
+        write_with_backup_if_changed(page, new_html, backup=backup)
+    return report
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description="Placeholders LQIP + color dominante para las miniaturas de la home.")
+
+    ap.add_argument("--root", default=".", help="Root del proyecto (default: .)")
+    ap.add_argument("--page", default=DEFAULT_PAGE, help=f"Página HTML relativa a root (default: {DEFAULT_PAGE})")
+    ap.add_argument(
+        "--images",
+        default=DEFAULT_IMAGES_DIR,
+        help=f"Carpeta de miniaturas relativa a root (default: {DEFAULT_IMAGES_DIR})",
+    )
+    ap.add_argument("--workers", type=int, default=4, help="Procesos para calcular placeholders (default: 4)")
+
+    ap.add_argument("--dry-run", action="store_true", help="No escribe el HTML; solo reporte")
+    ap.add_argument("--apply", action="store_true", help="Reescribe el HTML si cambió")
+    ap.add_argument("--backup", action="store_true", help="Crea .bak (sin timestamp) al sobrescribir")
+    args = ap.parse_args(argv)
+
+    root = Path(args.root).resolve()
+    page = (root / args.page).resolve()
+    if not page.is_file():
+        print(f"ERROR: no existe la página: {args.page}")
+        return 2
+
+    write = args.apply and not args.dry_run
+    report = lqip_page(
+        root=root,
+        page=page,
+        images_dir=(root / args.images).resolve(),
+        workers=max(1, int(args.workers)),
+        dry_run=not write,
+        backup=bool(args.backup),
+    )
+
+    net = report.bytes_deferred - report.bytes_inlined
+    print("\n=== LQIP THUMBNAILS REPORT ===")
+    print(f"page: {page.relative_to(root).as_posix()}")
+    print(
+        f"thumbnails: {report.images} ({report.bytes_thumbs / 1024:.0f} KiB) | "
+        f"computed {report.computed} | cached {report.images - report.computed}"
+    )
+    print(f"<img> {'patched' if write else 'to patch'}: {report.imgs_patched}")
+    print(f"hover variants deferred to first hover: {report.hover_deferred} ({report.bytes_deferred / 1024:.0f} KiB)")
+    print(f"placeholders inlined in HTML: {report.bytes_inlined / 1024:.1f} KiB")
+    if report.bytes_thumbs:
+        print(
+            f"first-load image weight removed: {net / 1024:.0f} KiB "
+            f"({100 * net / report.bytes_thumbs:.0f}% of the gallery thumbnails)"
+        )
+    for src in report.skipped:
+        print(f"  · skipped (has its own style=): {src}")
+
+    if args.dry_run:
+        print("\n(Dry-run) Nothing written.")
+        return 0
+
+    if not args.apply:
+        print("\nNothing written (pass --apply to write).")
+        return 0
+
+    print(f"\nOK: {page.relative_to(root).as_posix()} {'rewritten' if report.page_changed else 'unchanged'}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
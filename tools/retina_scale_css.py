@@ -18,21 +18,41 @@ Mejoras v2 (respecto propuesta inicial):
 - Header estable (sin timestamp) por defecto.
 - Puede insertar el <link> al final del <head> (simple o con media="...").
 - Filtra @media internos claramente mobile-only (max-width <= 960) para evitar anidación inútil.
+
+Mejoras v3:
+- Los @media internos se evalúan como intervalos (width/height/resolution) y features
+  discretas (hover/pointer/orientation/...) intersectados con el @media externo:
+  se omiten los inalcanzables, se quitan condiciones redundantes y se reporta qué cambió.
+  Condiciones en em/rem dependen del font-size del usuario: no se evalúan.
+- API en memoria (generate_override_text): recibe texto/bytes con nombres lógicos y
+  devuelve (css, reporte) sin tocar disco ni stdout; reentrante y thread-safe, con
+  ParseCache opcional para procesos residentes (dev server, watch, tests).
+- IR compacta (__slots__ + array) construida una vez por stylesheet e independiente de las
+  opciones: el emisor trabaja sobre ella. Se guarda en disco (--ir-cache, por default
+  .retina-ir-cache.pickle; también el stage retina-css de tools/build.py): en la próxima
+  corrida solo se re-parsean los CSS que cambiaron. Ver tools/bench_retina_ir.py.
 """
 
 from __future__ import annotations
 
 import argparse
+import hashlib
+import io
+import pickle
 import re
 import shutil
 import sys
-from dataclasses import dataclass
+import threading
+from array import array
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple, Union
 
 import tinycss2
 from copy import copy
 
+from site_io import replace_bytes, replace_text, write_with_backup_if_changed
+
 
 # -----------------------------
 # Tipos y helpers
@@ -46,13 +66,24 @@ class Example:
     before: str
     after: str
 
+@dataclass
+class MediaChange:
+    """Registro de un @media interno podado o simplificado (para el reporte)."""
+    file: str
+    before: str
+    action: str  # "skipped" | "simplified" | "flattened"
+    after: str = ""
+
 @dataclass
 class FileReport:
-    path: Path
+    name: str
     decls_changed: int = 0
     px_replaced: int = 0
     rules_emitted: int = 0
     media_rules_skipped: int = 0
+    media_rules_simplified: int = 0
+    media_rules_flattened: int = 0
+    media_changes: List[MediaChange] = field(default_factory=list)
 
 @dataclass
 class RunReport:
@@ -68,8 +99,12 @@ class RunReport:
     total_px_replaced: int = 0
     rules_emitted: int = 0
     media_rules_skipped: int = 0
+    media_rules_simplified: int = 0
+    media_rules_flattened: int = 0
     examples: List[Example] = None
     per_file: List[FileReport] = None
+    media_changes: List[MediaChange] = None
+    warnings: List[str] = None
 
 
 def _format_number(n: float, max_decimals: int = 4) -> str:
@@ -138,7 +173,7 @@ def _extract_css_links_from_html(index_html: Path) -> List[str]:
     return cleaned
 
 
-def _resolve_css_files_in_order(root: Path, css_dir: Path, index_html: Optional[Path], out_name: str, only_linked: bool) -> List[Path]:
+def resolve_css_files_in_order(root: Path, css_dir: Path, index_html: Optional[Path], out_name: str, only_linked: bool) -> List[Path]:
     """
     Lista de CSS a procesar en orden de cascada:
     - Primero los <link> del index.html que apunten al css_dir.
@@ -241,137 +276,658 @@ def _strip_comments_nested(css: str) -> str:
 
 
 # -----------------------------
-# Transformación AST tokens (px)
+# @media interno: evaluación por intervalos
 # -----------------------------
+#
+# Cada media query se normaliza a una conjunción de restricciones:
+# - rangos numéricos (width/height en px, resolution en dppx) como intervalos,
+# - features discretas (hover, pointer, orientation, ...) como conjuntos de valores,
+# - media type (screen/print/all).
+# Una lista con comas es un OR de conjunciones. El @media externo (desktop retina) se
+# parsea igual, así que un @media interno es alcanzable si alguna de sus ramas intersecta
+# alguna rama externa. Lo que no sabemos evaluar (not, or, features desconocidas) se trata
+# como "sin restricción": nunca se poda algo que podría aplicar.
+
+_INF = float("inf")
+
+# Unidades de longitud ABSOLUTAS en media queries. em/rem (y ex/ch) se resuelven contra el
+# font-size por defecto del usuario, que no es fijo: esas condiciones quedan opacas (nunca
+# se podan ni se simplifican).
+_LENGTH_TO_PX = {
+    "px": 1.0,
+    "in": 96.0,
+    "cm": 96.0 / 2.54,
+    "mm": 96.0 / 25.4,
+    "q": 96.0 / 101.6,
+    "pt": 96.0 / 72.0,
+    "pc": 16.0,
+}
+
+_RESOLUTION_TO_DPPX = {
+    "dppx": 1.0,
+    "x": 1.0,
+    "dpi": 1.0 / 96.0,
+    "dpcm": 2.54 / 96.0,
+}
+
+_RANGE_FEATURES = {
+    "width": "width",
+    "height": "height",
+    "resolution": "resolution",
+    "device-pixel-ratio": "resolution",
+}
+
+_DISCRETE_FEATURES = {
+    "hover": frozenset({"none", "hover"}),
+    "any-hover": frozenset({"none", "hover"}),
+    "pointer": frozenset({"none", "coarse", "fine"}),
+    "any-pointer": frozenset({"none", "coarse", "fine"}),
+    "orientation": frozenset({"portrait", "landscape"}),
+    "prefers-reduced-motion": frozenset({"no-preference", "reduce"}),
+    "prefers-color-scheme": frozenset({"light", "dark"}),
+}
+
+_MEDIA_TYPES = {"all", "screen", "print"}
+
+
+@dataclass(frozen=True)
+class _Interval:
+    lo: float = -_INF
+    lo_incl: bool = True
+    hi: float = _INF
+    hi_incl: bool = True
+
+    def intersect(self, other: "_Interval") -> "_Interval":
+        if other.lo > self.lo or (other.lo == self.lo and not other.lo_incl):
+            lo, lo_incl = other.lo, other.lo_incl
+        else:
+            lo, lo_incl = self.lo, self.lo_incl
+        if other.hi < self.hi or (other.hi == self.hi and not other.hi_incl):
+            hi, hi_incl = other.hi, other.hi_incl
+        else:
+            hi, hi_incl = self.hi, self.hi_incl
+        return _Interval(lo, lo_incl, hi, hi_incl)
 
-def _scale_tokens(
-    tokens,
-    *,
-    scale: float,
-    scale_hairlines: bool,
-    hairline_threshold: float,
-    examples: List[Example],
-    ctx: Dict[str, str],
-) -> Tuple[List, bool, int]:
-    """Escala DimensionTokens en px recorriendo recursivamente FunctionBlocks/Blocks.
-    NO toca url(...) ni strings.
-    """
-    changed = False
-    replaced = 0
-    out = []
+    def is_empty(self) -> bool:
+        if self.lo > self.hi:
+            return True
+        return self.lo == self.hi and not (self.lo_incl and self.hi_incl)
 
+    def within(self, other: "_Interval") -> bool:
+        """True si self ⊆ other."""
+        return self.intersect(other) == self
+
+
+@dataclass(frozen=True)
+class _MediaFeature:
+    """Una condición "(...)" de una media query. name=None => no evaluable (opaca)."""
+    text: str
+    name: Optional[str] = None
+    interval: Optional[_Interval] = None
+    choices: Optional[FrozenSet[str]] = None
+
+
+@dataclass
+class _MediaContext:
+    """Conjunción de restricciones (una rama de una media query list)."""
+    media_type: Optional[str] = None
+    ranges: Dict[str, _Interval] = field(default_factory=dict)
+    choices: Dict[str, FrozenSet[str]] = field(default_factory=dict)
+
+    def with_type(self, media_type: Optional[str]) -> "_MediaContext":
+        ctx = _MediaContext(self.media_type, dict(self.ranges), dict(self.choices))
+        if media_type and media_type != "all":
+            if ctx.media_type is None:
+                ctx.media_type = media_type
+            elif ctx.media_type != media_type:
+                ctx.media_type = "<empty>"
+        return ctx
+
+    def with_feature(self, f: _MediaFeature) -> "_MediaContext":
+        ctx = _MediaContext(self.media_type, dict(self.ranges), dict(self.choices))
+        if f.interval is not None:
+            ctx.ranges[f.name] = ctx.ranges.get(f.name, _Interval()).intersect(f.interval)
+        elif f.choices is not None:
+            ctx.choices[f.name] = ctx.choices.get(f.name, _DISCRETE_FEATURES[f.name]) & f.choices
+        return ctx
+
+    def merged(self, other: "_MediaContext") -> "_MediaContext":
+        ctx = self.with_type(other.media_type)
+        for name, iv in other.ranges.items():
+            ctx.ranges[name] = ctx.ranges.get(name, _Interval()).intersect(iv)
+        for name, ch in other.choices.items():
+            ctx.choices[name] = ctx.choices.get(name, _DISCRETE_FEATURES[name]) & ch
+        return ctx
+
+    def is_empty(self) -> bool:
+        if self.media_type == "<empty>":
+            return True
+        if any(iv.is_empty() for iv in self.ranges.values()):
+            return True
+        return any(not ch for ch in self.choices.values())
+
+    def implies(self, f: _MediaFeature) -> bool:
+        if f.interval is not None:
+            return self.ranges.get(f.name, _Interval()).within(f.interval)
+        if f.choices is not None:
+            return self.choices.get(f.name, _DISCRETE_FEATURES[f.name]) <= f.choices
+        return False
+
+    def implies_type(self, media_type: Optional[str]) -> bool:
+        return media_type in (None, "all") or self.media_type == media_type
+
+
+@dataclass
+class _MediaQuery:
+    """Una rama (entre comas) de una media query list."""
+    text: str
+    only: bool = False
+    media_type: Optional[str] = None
+    features: List[_MediaFeature] = field(default_factory=list)
+    opaque: bool = False  # not/or/sintaxis desconocida: no se evalúa ni se simplifica
+
+    def context(self, base: _MediaContext) -> _MediaContext:
+        if self.opaque:
+            return base
+        ctx = base.with_type(self.media_type)
+        for f in self.features:
+            if f.name is not None:
+                ctx = ctx.with_feature(f)
+        return ctx
+
+    def serialize(self) -> str:
+        parts = []
+        if self.media_type is not None:
+            parts.append(f"{'only ' if self.only else ''}{self.media_type}")
+        parts.extend(f.text for f in self.features)
+        return " and ".join(parts)
+
+
+def _significant(tokens) -> List:
+    return [t for t in tokens if t.type not in ("whitespace", "comment")]
+
+
+def _media_value(name: str, tok) -> Optional[float]:
+    """Convierte un token a la unidad canónica del feature (px o dppx)."""
+    if name == "resolution":
+        if tok.type == "dimension":
+            factor = _RESOLUTION_TO_DPPX.get(tok.lower_unit)
+            return None if factor is None else float(tok.value) * factor
+        return None
+    if name == "device-pixel-ratio":
+        return float(tok.value) if tok.type == "number" else None
+    if tok.type == "dimension":
+        factor = _LENGTH_TO_PX.get(tok.lower_unit)
+        return None if factor is None else float(tok.value) * factor
+    if tok.type == "number" and tok.value == 0:
+        return 0.0
+    return None
+
+
+def _split_feature_name(raw: str) -> Tuple[Optional[str], str]:
+    """'-webkit-min-device-pixel-ratio' -> ('min', 'device-pixel-ratio')."""
+    name = raw.lower()
+    if name.startswith("-webkit-"):
+        name = name[len("-webkit-"):]
+    name = name.replace("min--moz-", "min-").replace("max--moz-", "max-")
+    if name.startswith("-moz-"):
+        name = name[len("-moz-"):]
+    for prefix in ("min", "max"):
+        if name.startswith(prefix + "-"):
+            return prefix, name[len(prefix) + 1:]
+    return None, name
+
+
+def _interval_for(op: str, v: float) -> Optional[_Interval]:
+    """Intervalo para "feature OP v"."""
+    if op == "<":
+        return _Interval(hi=v, hi_incl=False)
+    if op == "<=":
+        return _Interval(hi=v)
+    if op == ">":
+        return _Interval(lo=v, lo_incl=False)
+    if op == ">=":
+        return _Interval(lo=v)
+    if op == "=":
+        return _Interval(lo=v, hi=v)
+    return None
+
+
+_FLIP_OP = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "="}
+
+
+def _parse_range_feature(text: str, toks: List) -> _MediaFeature:
+    """Sintaxis de rangos level 4: (width >= 600px), (400px <= width < 700px)."""
+    items: List = []
+    i = 0
+    while i < len(toks):
+        t = toks[i]
+        if t.type == "literal" and t.value in ("<", ">", "="):
+            op = t.value
+            if op != "=" and i + 1 < len(toks) and toks[i + 1].type == "literal" and toks[i + 1].value == "=":
+                op += "="
+                i += 1
+            items.append(op)
+        else:
+            items.append(t)
+        i += 1
+
+    names = [k for k, it in enumerate(items) if not isinstance(it, str) and it.type == "ident"]
+    if len(names) != 1 or (len(items), names[0]) not in ((3, 0), (3, 2), (5, 2)):
+        return _MediaFeature(text)
+    k = names[0]
+    canonical = _RANGE_FEATURES.get(items[k].lower_value)
+    if canonical is None:
+        return _MediaFeature(text)
+
+    interval = _Interval()
+    # Pares (izquierda, op, derecha) alrededor del nombre del feature.
+    pairs = []
+    if k >= 2:
+        pairs.append((_FLIP_OP.get(items[k - 1]) if isinstance(items[k - 1], str) else None, items[k - 2]))
+    if k + 2 < len(items):
+        pairs.append((items[k + 1] if isinstance(items[k + 1], str) else None, items[k + 2]))
+    for op, tok in pairs:
+        if op is None or isinstance(tok, str):
+            return _MediaFeature(text)
+        v = _media_value(items[k].lower_value, tok)
+        iv = _interval_for(op, v) if v is not None else None
+        if iv is None:
+            return _MediaFeature(text)
+        interval = interval.intersect(iv)
+    return _MediaFeature(text, name=canonical, interval=interval)
+
+
+def _parse_media_feature(block) -> _MediaFeature:
+    text = tinycss2.serialize([block]).strip()
+    toks = _significant(block.content)
+    if not toks:
+        return _MediaFeature(text)
+
+    # Forma booleana: (hover), (pointer)
+    if len(toks) == 1 and toks[0].type == "ident":
+        name = toks[0].lower_value
+        domain = _DISCRETE_FEATURES.get(name)
+        if domain is None:
+            return _MediaFeature(text)
+        return _MediaFeature(text, name=name, choices=domain - {"none", "no-preference"})
+
+    # Forma clásica: (min-width: 961px), (orientation: landscape)
+    if toks[0].type == "ident" and len(toks) == 3 and toks[1].type == "literal" and toks[1].value == ":":
+        prefix, name = _split_feature_name(toks[0].value)
+        value = toks[2]
+        if name in _DISCRETE_FEATURES and prefix is None:
+            if value.type != "ident" or value.lower_value not in _DISCRETE_FEATURES[name]:
+                return _MediaFeature(text)
+            return _MediaFeature(text, name=name, choices=frozenset({value.lower_value}))
+        canonical = _RANGE_FEATURES.get(name)
+        v = _media_value(name, value) if canonical else None
+        if v is None:
+            return _MediaFeature(text)
+        op = {"min": ">=", "max": "<=", None: "="}[prefix]
+        return _MediaFeature(text, name=canonical, interval=_interval_for(op, v))
+
+    return _parse_range_feature(text, toks)
+
+
+def _parse_media_query(tokens) -> _MediaQuery:
+    text = tinycss2.serialize(tokens).strip()
+    toks = _significant(tokens)
+    q = _MediaQuery(text=text)
+    i = 0
+
+    if i < len(toks) and toks[i].type == "ident" and toks[i].lower_value in ("not", "only"):
+        if toks[i].lower_value == "not":
+            q.opaque = True
+            return q
+        q.only = True
+        i += 1
+    if i < len(toks) and toks[i].type == "ident":
+        mt = toks[i].lower_value
+        if mt not in _MEDIA_TYPES:
+            q.opaque = True
+            return q
+        q.media_type = mt
+        i += 1
+        if i < len(toks):
+            if not (toks[i].type == "ident" and toks[i].lower_value == "and"):
+                q.opaque = True
+                return q
+            i += 1
+
+    while i < len(toks):
+        t = toks[i]
+        if t.type != "() block":
+            q.opaque = True
+            return q
+        q.features.append(_parse_media_feature(t))
+        i += 1
+        if i < len(toks):
+            if not (toks[i].type == "ident" and toks[i].lower_value == "and") or i + 1 >= len(toks):
+                q.opaque = True
+                return q
+            i += 1
+
+    if q.media_type is None and (q.only or not q.features):
+        q.opaque = True
+    return q
+
+
+def _parse_media_query_list(tokens) -> List[_MediaQuery]:
+    queries = []
+    current: List = []
     for t in tokens:
-        # No tocar strings ni URL tokens
-        if t.type in ("string", "url"):
-            out.append(t)
-            continue
+        if t.type == "literal" and t.value == ",":
+            queries.append(_parse_media_query(current))
+            current = []
+        else:
+            current.append(t)
+    queries.append(_parse_media_query(current))
+    return queries
 
-        # FunctionBlock: no tocar url(...), sí tocar el resto
-        if t.type == "function":
-            name = getattr(t, "lower_name", t.name.lower())
-            if name == "url":
-                out.append(t)
+
+def _media_context_from_query(media_query: str) -> List[_MediaContext]:
+    """Contexto (OR de conjunciones) a partir de un texto de media query (p.ej. el externo)."""
+    tokens = tinycss2.parse_component_value_list(media_query, skip_comments=True)
+    return [q.context(_MediaContext()) for q in _parse_media_query_list(tokens)]
+
+
+def _simplify_media_query(q: _MediaQuery, context: List[_MediaContext]) -> Optional[_MediaQuery]:
+    """
+    Devuelve la rama simplificada (sin condiciones implicadas por el contexto),
+    o None si la rama no puede aplicar dentro del contexto.
+    """
+    if q.opaque:
+        return q
+    if all(q.context(k).is_empty() for k in context):
+        return None
+
+    features = list(q.features)
+    changed = True
+    while changed:
+        changed = False
+        for f in features:
+            if f.name is None:
                 continue
-            inner, ch, rep = _scale_tokens(
-                t.arguments,
-                scale=scale,
-                scale_hairlines=scale_hairlines,
-                hairline_threshold=hairline_threshold,
-                examples=examples,
-                ctx=ctx,
-            )
-            if ch:
-                nt = copy(t)
-                nt.arguments = inner
-                out.append(nt)
+            rest = _MediaQuery(q.text, q.only, q.media_type, [g for g in features if g is not f])
+            # f sobra si lo implica cada rama externa donde el resto de la query es posible
+            # (donde no lo es, la query sigue siendo falsa con o sin f).
+            live = [k for k in context if not rest.context(k).is_empty()]
+            if all(k.implies(f) for k in live):
+                features = rest.features
                 changed = True
-                replaced += rep
-            else:
-                out.append(t)
-            continue
+                break
 
-        # Bloques: () [] {}
-        if t.type in ("() block", "[] block", "{} block"):
-            inner, ch, rep = _scale_tokens(
-                t.content,
-                scale=scale,
-                scale_hairlines=scale_hairlines,
-                hairline_threshold=hairline_threshold,
-                examples=examples,
-                ctx=ctx,
-            )
+    media_type = q.media_type
+    live = [k for k in context if not q.context(k).is_empty()]
+    if media_type is not None and all(k.implies_type(media_type) for k in live):
+        media_type = None
+    return _MediaQuery(q.text, q.only and media_type is not None, media_type, features)
+
+
+def _evaluate_nested_media(
+    queries: List[_MediaQuery],
+    original: str,
+    context: List[_MediaContext],
+) -> Tuple[str, str, List[_MediaContext]]:
+    """
+    Evalúa un @media interno contra el contexto externo.
+    Devuelve (action, prelude, child_context) con action en:
+    - "skipped": ninguna rama puede aplicar => se omite el bloque entero.
+    - "flattened": siempre aplica dentro del contexto => se emiten los hijos sin @media.
+    - "simplified": se quitaron ramas/condiciones redundantes.
+    - "kept": sin cambios.
+    """
+    reachable: List[_MediaQuery] = []
+    simplified: List[_MediaQuery] = []
+    for q in queries:
+        s = _simplify_media_query(q, context)
+        if s is not None:
+            reachable.append(q)
+            simplified.append(s)
+
+    if not reachable:
+        return "skipped", original, context
+
+    child_context = [
+        ctx
+        for k in context
+        for q in reachable
+        for ctx in (q.context(k),)
+        if not ctx.is_empty()
+    ]
+
+    if any(not s.opaque and s.media_type is None and not s.features for s in simplified):
+        return "flattened", original, context
+
+    unchanged = len(reachable) == len(queries) and all(
+        s.opaque or (s.media_type == q.media_type and len(s.features) == len(q.features))
+        for s, q in zip(simplified, queries)
+    )
+    if unchanged:
+        return "kept", original, child_context
+    prelude = ", ".join(s.text if s.opaque else s.serialize() for s in simplified)
+    return "simplified", prelude, child_context
+
+
+# -----------------------------
+# Representación intermedia compacta (IR)
+# -----------------------------
+#
+# Se construye UNA vez por stylesheet a partir del parse de tinycss2 y es independiente de
+# las opciones (scale, hairlines, breakpoint): re-emitir con otras opciones no re-parsea.
+# Solo guarda lo que el emisor puede llegar a escribir:
+# - declaraciones con al menos un px, como plantilla de texto: segments[i] + valor_i + segments[i+1]...
+#   (los valores en un array('d'), la representación original para hairlines/ejemplos);
+# - reglas que contienen alguna de esas declaraciones (y los @media, para el reporte).
+
+_IR_VERSION = 2  # v2: media features en em/rem pasan a ser opacas
+IR_CACHE_FILE = ".retina-ir-cache.pickle"
+_PX_SLOT = "\x00"  # tinycss2 reemplaza U+0000 al tokenizar: no aparece en el CSS serializado
+
+
+class DeclIR:
+    __slots__ = ("name", "important", "segments", "values", "reps")
+
+    def __init__(self, name: str, important: bool, segments: Tuple[str, ...], values: array, reps: Tuple[str, ...]):
+        self.name = name
+        self.important = important
+        self.segments = segments
+        self.values = values
+        self.reps = reps
+
+
+class RuleIR:
+    """Regla de estilo (at_keyword=None) o at-rule con hijos y/o declaraciones propias."""
+    __slots__ = ("at_keyword", "prelude", "decls", "children", "media")
+
+    def __init__(
+        self,
+        at_keyword: Optional[str],
+        prelude: str,
+        decls: Tuple[DeclIR, ...] = (),
+        children: Tuple["RuleIR", ...] = (),
+        media: Optional[List[_MediaQuery]] = None,
+    ):
+        self.at_keyword = at_keyword
+        self.prelude = prelude
+        self.decls = decls
+        self.children = children
+        self.media = media
+
+
+class StylesheetIR:
+    __slots__ = ("name", "digest", "errors", "rules")
+
+    def __init__(self, name: str, digest: str, errors: int, rules: Tuple[RuleIR, ...]):
+        self.name = name
+        self.digest = digest
+        self.errors = errors
+        self.rules = rules
+
+
+def _mark_px_tokens(tokens, values: List[float], reps: List[str]) -> Tuple[List, bool]:
+    """
+    Copia los tokens reemplazando la representación de cada px por _PX_SLOT.
+    Mismo recorrido que el escalado: entra en funciones y bloques, NO en url(...) ni strings.
+    """
+    found = False
+    out = []
+    for t in tokens:
+        if t.type == "function" and getattr(t, "lower_name", t.name.lower()) != "url":
+            inner, ch = _mark_px_tokens(t.arguments, values, reps)
             if ch:
-                nt = copy(t)
-                nt.content = inner
-                out.append(nt)
-                changed = True
-                replaced += rep
-            else:
-                out.append(t)
+                t = copy(t)
+                t.arguments = inner
+                found = True
+        elif t.type in ("() block", "[] block", "{} block"):
+            inner, ch = _mark_px_tokens(t.content, values, reps)
+            if ch:
+                t = copy(t)
+                t.content = inner
+                found = True
+        elif t.type == "dimension" and t.lower_unit == "px":
+            values.append(float(t.value))
+            reps.append(t.representation)
+            t = copy(t)
+            t.representation = _PX_SLOT
+            found = True
+        out.append(t)
+    return out, found
+
+
+def _build_decls(content) -> Tuple[DeclIR, ...]:
+    decls = []
+    for d in tinycss2.parse_declaration_list(content, skip_whitespace=True, skip_comments=True):
+        if d.type != "declaration":
             continue
+        values: List[float] = []
+        reps: List[str] = []
+        marked, found = _mark_px_tokens(d.value, values, reps)
+        if not found:
+            continue
+        segments = tuple(tinycss2.serialize(marked).strip().split(_PX_SLOT))
+        decls.append(DeclIR(sys.intern(d.name), d.important, segments, array("d", values), tuple(reps)))
+    return tuple(decls)
 
-        # DimensionToken: 10px, -12px, 0.5px
-        if t.type == "dimension" and t.lower_unit == "px":
-            v = float(t.value)
-            av = abs(v)
 
-            # Hairlines: por defecto NO escalar (evita bordes borrosos)
-            if (not scale_hairlines) and av <= hairline_threshold and av != 0:
-                out.append(t)
-                continue
+def _build_rule(rule) -> Optional[RuleIR]:
+    if rule.type == "qualified-rule":
+        decls = _build_decls(rule.content)
+        if not decls:
+            return None
+        return RuleIR(None, tinycss2.serialize(rule.prelude).strip(), decls)
 
-            nv = v * scale
-            nt = copy(t)
-            nt.value = nv
-            nt.representation = _format_number(nv)
-
-            out.append(nt)
-            changed = True
-            replaced += 1
-
-            if len(examples) < 12:
-                examples.append(
-                    Example(
-                        file=ctx.get("file", ""),
-                        selector=ctx.get("selector", ""),
-                        prop=ctx.get("prop", ""),
-                        before=f"{t.representation}{t.unit}",
-                        after=f"{nt.representation}{nt.unit}",
-                    )
-                )
-            continue
+    if rule.type == "at-rule" and rule.content is not None:
+        prelude = tinycss2.serialize(rule.prelude).strip() if rule.prelude is not None else ""
+        is_media = rule.at_keyword.lower() == "media"
+        nested = tinycss2.parse_rule_list(rule.content, skip_whitespace=True, skip_comments=True)
+        children = tuple(ir for ir in map(_build_rule, nested) if ir is not None)
+        # Si no hay reglas anidadas puede ser un bloque de declaraciones (@font-face, @page).
+        decls = () if children else _build_decls(rule.content)
+        if not children and not decls and not is_media:
+            return None
+        media = _parse_media_query_list(rule.prelude) if is_media else None
+        return RuleIR(sys.intern(rule.at_keyword), prelude, decls, children, media)
 
-        out.append(t)
+    return None
 
-    return out, changed, replaced
 
+def build_stylesheet_ir(name: str, text: str) -> StylesheetIR:
+    """Parsea (tolerando comentarios anidados) y construye la IR del stylesheet."""
+    digest = hashlib.sha1(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+    rules = tinycss2.parse_stylesheet(_strip_comments_nested(text), skip_whitespace=True, skip_comments=True)
+    errors = sum(1 for r in rules if getattr(r, "type", None) == "error")
+    return StylesheetIR(name, digest, errors, tuple(ir for ir in map(_build_rule, rules) if ir is not None))
+
+
+# Clases que puede traer el pickle de la IR. pickle guarda "<módulo>.<clase>" y el módulo es
+# __main__ cuando la herramienta corre como script: se resuelven por nombre en ESTE módulo,
+# así el cache sirve igual desde la CLI y desde tools/build.py. Cualquier otro global se rechaza.
+_IR_PICKLE_CLASSES = frozenset({"StylesheetIR", "RuleIR", "DeclIR", "_MediaQuery", "_MediaFeature", "_Interval"})
 
-# -----------------------------
-# @media interno: filtro anti-mobile
-# -----------------------------
 
-_MAXW_RE = re.compile(r"max-width\s*:\s*([0-9]*\.?[0-9]+)\s*px", re.IGNORECASE)
+class _IRUnpickler(pickle.Unpickler):
+    def find_class(self, module: str, name: str):
+        if name in _IR_PICKLE_CLASSES:
+            return globals()[name]
+        if module == "array" and name in ("array", "_array_reconstructor"):
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"global no permitido en la IR: {module}.{name}")
 
-def _is_media_clearly_mobile_only(media_prelude: str, *, min_width: int) -> bool:
+
+def save_stylesheet_irs(path: Path, irs: Sequence[StylesheetIR]) -> None:
+    """Guarda IRs en disco (pickle versionado, escritura atómica) para reusarlas entre ejecuciones."""
+    replace_bytes(path, pickle.dumps((_IR_VERSION, list(irs)), protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load_stylesheet_irs(path: Path) -> List[StylesheetIR]:
     """
-    Heurística: si el @media interno tiene un max-width <= (min_width-1),
-    entonces no puede aplicar dentro del outer @media (min-width=min_width).
-    En ese caso, lo omitimos para evitar anidar @media inútil.
+    Carga IRs guardadas con save_stylesheet_irs. Es un cache: si no existe, es de otra versión
+    o está corrupto devuelve [] y las IRs se reconstruyen desde el CSS.
     """
-    lows = []
-    for m in _MAXW_RE.finditer(media_prelude or ""):
-        try:
-            lows.append(float(m.group(1)))
-        except:
-            pass
-    if not lows:
-        return False
-    # si TODOS los max-width son <= min_width-1 => mobile-only
-    return all(v <= (min_width - 1) for v in lows)
+    try:
+        version, irs = _IRUnpickler(io.BytesIO(path.read_bytes())).load()
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        return []
+    return irs if version == _IR_VERSION else []
+
+
+# -----------------------------
+# Emisión del override
+# -----------------------------
+
+def _emit_decls(
+    decls: Tuple[DeclIR, ...],
+    *,
+    ind: str,
+    scale: float,
+    scale_hairlines: bool,
+    hairline_threshold: float,
+    examples: List[Example],
+    source_file: str,
+    selector: str,
+    rep: FileReport,
+) -> List[str]:
+    """Escala los px de cada declaración; devuelve solo las líneas que cambiaron."""
+    lines = []
+    for d in decls:
+        segs = d.segments
+        out = [segs[0]]
+        replaced = 0
+        for i, v in enumerate(d.values):
+            av = abs(v)
+            # Hairlines: por defecto NO escalar (evita bordes borrosos)
+            if (not scale_hairlines) and av <= hairline_threshold and av != 0:
+                out.append(d.reps[i])
+            else:
+                after = _format_number(v * scale)
+                out.append(after)
+                replaced += 1
+                if len(examples) < 12:
+                    unit = segs[i + 1][:2]  # "px" en la capitalización original
+                    examples.append(
+                        Example(
+                            file=source_file,
+                            selector=selector,
+                            prop=d.name,
+                            before=f"{d.reps[i]}{unit}",
+                            after=f"{after}{unit}",
+                        )
+                    )
+            out.append(segs[i + 1])
+        if not replaced:
+            continue
 
+        imp = " !important" if d.important else ""
+        lines.append(f"{ind}  {d.name}: {''.join(out)}{imp};")
+        rep.decls_changed += 1
+        rep.px_replaced += replaced
+    return lines
 
-def _process_rule(
-    rule,
+
+def _emit_rule(
+    rule: RuleIR,
     *,
     indent: int,
     scale: float,
@@ -380,133 +936,195 @@ def _process_rule(
     examples: List[Example],
     source_file: str,
     rep: FileReport,
-    outer_min_width: int,
+    media_context: List[_MediaContext],
     keep_nested_media: bool,
 ) -> Optional[str]:
     """Devuelve CSS para el override de ESTE rule, o None si no hay cambios."""
     ind = " " * indent
+    scaling = dict(scale=scale, scale_hairlines=scale_hairlines, hairline_threshold=hairline_threshold)
 
     # Reglas normales: selector { decls }
-    if rule.type == "qualified-rule":
-        selector = tinycss2.serialize(rule.prelude).strip()
-        decls = tinycss2.parse_declaration_list(rule.content, skip_whitespace=True, skip_comments=True)
-
-        lines = []
-        for d in decls:
-            if d.type != "declaration":
-                continue
-
-            ctx = {"file": source_file, "selector": selector, "prop": d.name}
-            new_tokens, ch, replaced = _scale_tokens(
-                d.value,
-                scale=scale,
-                scale_hairlines=scale_hairlines,
-                hairline_threshold=hairline_threshold,
-                examples=examples,
-                ctx=ctx,
-            )
-            if not ch:
-                continue
-
-            val = tinycss2.serialize(new_tokens).strip()
-            imp = " !important" if d.important else ""
-            lines.append(f"{ind}  {d.name}: {val}{imp};")
-
-            rep.decls_changed += 1
-            rep.px_replaced += replaced
-
+    if rule.at_keyword is None:
+        lines = _emit_decls(
+            rule.decls,
+            ind=ind,
+            examples=examples,
+            source_file=source_file,
+            selector=rule.prelude,
+            rep=rep,
+            **scaling,
+        )
         if not lines:
             return None
 
         rep.rules_emitted += 1
-        return f"{ind}{selector} {{\n" + "\n".join(lines) + f"\n{ind}}}\n"
+        return f"{ind}{rule.prelude} {{\n" + "\n".join(lines) + f"\n{ind}}}\n"
 
     # At-rules con bloque: @media/@supports/@keyframes/etc
-    if rule.type == "at-rule":
-        prelude = tinycss2.serialize(rule.prelude).strip() if rule.prelude is not None else ""
-        if rule.content is None:
+    prelude = rule.prelude
+
+    # @media interno: se evalúa contra el contexto externo (inalcanzable => omitimos)
+    media_action = None
+    new_prelude = prelude
+    child_context = media_context
+    if rule.media is not None and (not keep_nested_media):
+        media_action, new_prelude, child_context = _evaluate_nested_media(rule.media, prelude, media_context)
+        if media_action == "skipped":
+            rep.media_rules_skipped += 1
+            rep.media_changes.append(MediaChange(file=source_file, before=prelude, action=media_action))
             return None
 
-        # Filtro: @media interno mobile-only => omitimos
-        if rule.at_keyword.lower() == "media" and (not keep_nested_media):
-            if _is_media_clearly_mobile_only(prelude, min_width=outer_min_width):
-                rep.media_rules_skipped += 1
-                return None
-
-        # 1) tratar el bloque como lista de reglas anidadas
-        nested_rules = tinycss2.parse_rule_list(rule.content, skip_whitespace=True, skip_comments=True)
-        children = []
-        for r in nested_rules:
-            css = _process_rule(
-                r,
-                indent=indent + 2,
-                scale=scale,
-                scale_hairlines=scale_hairlines,
-                hairline_threshold=hairline_threshold,
-                examples=examples,
-                source_file=source_file,
-                rep=rep,
-                outer_min_width=outer_min_width,
-                keep_nested_media=keep_nested_media,
+    # 1) reglas anidadas
+    #    (si el @media siempre aplica dentro del externo, los hijos se emiten sin envoltorio)
+    flattened = media_action == "flattened"
+    children = []
+    for r in rule.children:
+        css = _emit_rule(
+            r,
+            indent=indent if flattened else indent + 2,
+            examples=examples,
+            source_file=source_file,
+            rep=rep,
+            media_context=child_context,
+            keep_nested_media=keep_nested_media,
+            **scaling,
+        )
+        if css:
+            children.append(css)
+
+    if children:
+        if flattened:
+            rep.media_rules_flattened += 1
+            rep.media_changes.append(MediaChange(file=source_file, before=prelude, action=media_action))
+            return "".join(children)
+        if media_action == "simplified":
+            rep.media_rules_simplified += 1
+            rep.media_changes.append(
+                MediaChange(file=source_file, before=prelude, action=media_action, after=new_prelude)
             )
-            if css:
-                children.append(css)
+            prelude = new_prelude
+        pre = f" {prelude}" if prelude else ""
+        return f"{ind}@{rule.at_keyword}{pre} {{\n" + "".join(children) + f"{ind}}}\n"
 
-        if children:
-            pre = f" {prelude}" if prelude else ""
-            return f"{ind}@{rule.at_keyword}{pre} {{\n" + "".join(children) + f"{ind}}}\n"
+    # 2) bloque de declaraciones (p.ej. @font-face, @page)
+    lines = _emit_decls(
+        rule.decls,
+        ind=ind,
+        examples=examples,
+        source_file=source_file,
+        selector=f"@{rule.at_keyword} {prelude}".strip(),
+        rep=rep,
+        **scaling,
+    )
+    if not lines:
+        return None
 
-        # 2) Si no había reglas anidadas, puede ser un bloque de declaraciones (p.ej. @font-face, @page)
-        decls = tinycss2.parse_declaration_list(rule.content, skip_whitespace=True, skip_comments=True)
-        lines = []
-        for d in decls:
-            if d.type != "declaration":
-                continue
-            ctx = {"file": source_file, "selector": f"@{rule.at_keyword} {prelude}".strip(), "prop": d.name}
-            new_tokens, ch, replaced = _scale_tokens(
-                d.value,
-                scale=scale,
-                scale_hairlines=scale_hairlines,
-                hairline_threshold=hairline_threshold,
-                examples=examples,
-                ctx=ctx,
-            )
-            if not ch:
-                continue
-            val = tinycss2.serialize(new_tokens).strip()
-            imp = " !important" if d.important else ""
-            lines.append(f"{ind}  {d.name}: {val}{imp};")
-            rep.decls_changed += 1
-            rep.px_replaced += replaced
+    rep.rules_emitted += 1
+    pre = f" {prelude}" if prelude else ""
+    return f"{ind}@{rule.at_keyword}{pre} {{\n" + "\n".join(lines) + f"\n{ind}}}\n"
 
-        if not lines:
-            return None
 
-        rep.rules_emitted += 1
-        pre = f" {prelude}" if prelude else ""
-        return f"{ind}@{rule.at_keyword}{pre} {{\n" + "\n".join(lines) + f"\n{ind}}}\n"
+# -----------------------------
+# API en memoria (sin I/O)
+# -----------------------------
 
-    return None
+CssText = Union[str, bytes, bytearray, memoryview]
 
 
-def generate_override(
+@dataclass(frozen=True)
+class OverrideOptions:
+    scale: float = 0.8
+    min_width: int = 961
+    include_pointer_fine: bool = True
+    dpr_threshold: float = 2.0
+    scale_hairlines: bool = False
+    hairline_threshold: float = 1.0
+    keep_nested_media: bool = False
+
+
+def _decode_css(data: CssText) -> str:
+    if isinstance(data, str):
+        return data
+    return bytes(data).decode("utf-8", errors="ignore")
+
+
+class ParseCache:
+    """
+    Cache thread-safe de stylesheets parseados (IR), por nombre lógico + hash del texto.
+    Guarda UNA versión por nombre (la última), así un proceso residente no crece sin límite.
+    La IR es inmutable en la práctica: se comparte entre hilos sin copiar.
+    """
+
+    def __init__(self, irs: Sequence[StylesheetIR] = ()) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[str, StylesheetIR] = {ir.name: ir for ir in irs}
+
+    def ir_for(self, name: str, text: str) -> StylesheetIR:
+        digest = hashlib.sha1(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+        with self._lock:
+            ir = self._entries.get(name)
+        if ir is not None and ir.digest == digest:
+            return ir
+        # Parseo fuera del lock: dos hilos con el mismo archivo nuevo parsean ambos (mismo resultado).
+        ir = build_stylesheet_ir(name, text)
+        with self._lock:
+            self._entries[name] = ir
+        return ir
+
+    def snapshot(self) -> List[StylesheetIR]:
+        """IRs actuales (p.ej. para save_stylesheet_irs)."""
+        with self._lock:
+            return list(self._entries.values())
+
+    @classmethod
+    def load(cls, path: Path) -> "ParseCache":
+        """Cache inicializado con las IRs guardadas en path (vacío si no hay)."""
+        return cls(load_stylesheet_irs(path))
+
+    def save(self, path: Path, names: Sequence[str]) -> bool:
+        """
+        Guarda las IRs de names (los CSS actuales; las de archivos que ya no están se descartan).
+        No reescribe si el archivo ya tiene esas mismas versiones. Devuelve si escribió.
+        """
+        wanted = set(names)
+        irs = sorted((ir for ir in self.snapshot() if ir.name in wanted), key=lambda ir: ir.name)
+        if {(ir.name, ir.digest) for ir in load_stylesheet_irs(path)} == {(ir.name, ir.digest) for ir in irs}:
+            return False
+        save_stylesheet_irs(path, irs)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def generate_override_text(
+    sources: Sequence[Tuple[str, CssText]],
+    options: OverrideOptions = OverrideOptions(),
     *,
-    root: Path,
-    css_dir: Path,
-    out_file: Path,
-    css_files: List[Path],
-    scale: float,
-    min_width: int,
-    include_pointer_fine: bool,
-    dpr_threshold: float,
-    scale_hairlines: bool,
-    hairline_threshold: float,
-    stable_header: bool,
-    keep_nested_media: bool,
+    cache: Optional[ParseCache] = None,
 ) -> Tuple[str, RunReport]:
-    """Genera el contenido completo de retina-80.css + reporte."""
+    """
+    Genera el contenido completo de retina-80.css + reporte a partir de CSS en memoria.
+    sources: [(nombre lógico, texto|bytes|memoryview)] en orden de cascada.
+    No lee ni escribe archivos ni imprime: los avisos quedan en report.warnings.
+    """
+    scale = options.scale
+    min_width = options.min_width
+    include_pointer_fine = options.include_pointer_fine
+    dpr_threshold = options.dpr_threshold
+    scale_hairlines = options.scale_hairlines
+    hairline_threshold = options.hairline_threshold
+    keep_nested_media = options.keep_nested_media
+
     examples: List[Example] = []
     per_file: List[FileReport] = []
+    media_changes: List[MediaChange] = []
+    warnings: List[str] = []
 
     report = RunReport(
         scale=scale,
@@ -517,32 +1135,35 @@ def generate_override(
         hairline_threshold=hairline_threshold,
         examples=examples,
         per_file=per_file,
+        media_changes=media_changes,
+        warnings=warnings,
     )
 
+    mq = _build_media_query(min_width=min_width, include_pointer_fine=include_pointer_fine, dpr_threshold=dpr_threshold)
+    media_context = _media_context_from_query(mq)
+
     body_parts: List[str] = []
 
-    for f in css_files:
-        rep = FileReport(path=f)
-        raw = f.read_text(encoding="utf-8", errors="ignore")
-        text = _strip_comments_nested(raw)
-        rules = tinycss2.parse_stylesheet(text, skip_whitespace=True, skip_comments=True)
-        error_rules = [r for r in rules if getattr(r, 'type', None) == 'error']
-        if error_rules:
+    for name, data in sources:
+        rep = FileReport(name=name)
+        text = _decode_css(data)
+        ir = cache.ir_for(name, text) if cache is not None else build_stylesheet_ir(name, text)
+        if ir.errors:
             # No abortamos: generamos lo que se pueda y avisamos.
-            print(f"WARN: CSS parse errors in {f.relative_to(root).as_posix()}: {len(error_rules)}")
+            warnings.append(f"CSS parse errors in {name}: {ir.errors}")
 
         local_parts: List[str] = []
-        for r in rules:
-            css = _process_rule(
+        for r in ir.rules:
+            css = _emit_rule(
                 r,
                 indent=2,
                 scale=scale,
                 scale_hairlines=scale_hairlines,
                 hairline_threshold=hairline_threshold,
                 examples=examples,
-                source_file=str(f.relative_to(root)).replace("\\", "/"),
+                source_file=name,
                 rep=rep,
-                outer_min_width=min_width,
+                media_context=media_context,
                 keep_nested_media=keep_nested_media,
             )
             if css:
@@ -552,6 +1173,9 @@ def generate_override(
         per_file.append(rep)
 
         report.media_rules_skipped += rep.media_rules_skipped
+        report.media_rules_simplified += rep.media_rules_simplified
+        report.media_rules_flattened += rep.media_rules_flattened
+        media_changes.extend(rep.media_changes)
 
         if rep.decls_changed > 0:
             report.files_with_changes += 1
@@ -559,11 +1183,9 @@ def generate_override(
             report.total_px_replaced += rep.px_replaced
             report.rules_emitted += rep.rules_emitted
 
-            body_parts.append(f"  /* ── source: {f.relative_to(root).as_posix()} ───────────────────────────── */\n")
+            body_parts.append(f"  /* ── source: {name} ───────────────────────────── */\n")
             body_parts.extend(local_parts)
 
-    mq = _build_media_query(min_width=min_width, include_pointer_fine=include_pointer_fine, dpr_threshold=dpr_threshold)
-
     # Header estable (idempotencia): sin timestamp por defecto
     header_lines = [
         "/*!",
@@ -605,38 +1227,34 @@ def generate_override(
     return content, report
 
 
-def _write_text_if_changed(path: Path, content: str) -> Tuple[bool, Optional[Path]]:
-    """
-    Escribe solo si cambió. Devuelve (wrote, backup_path).
-    No hace backup acá; solo compara.
-    """
-    if path.exists():
-        old = path.read_text(encoding="utf-8", errors="ignore")
-        if old == content:
-            return False, None
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(content, encoding="utf-8")
-    return True, None
-
-
-def _write_with_backup_if_changed(path: Path, content: str, backup: bool) -> Tuple[bool, Optional[Path]]:
-    """
-    Escribe solo si cambió; si cambia y backup=True, crea .bak (sin timestamp para idempotencia extra).
-    """
-    if path.exists():
-        old = path.read_text(encoding="utf-8", errors="ignore")
-        if old == content:
-            return False, None
-        bak_path = None
-        if backup:
-            bak_path = path.with_suffix(path.suffix + ".bak")
-            shutil.copy2(path, bak_path)
-        path.write_text(content, encoding="utf-8")
-        return True, bak_path
-
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(content, encoding="utf-8")
-    return True, None
+def generate_override(
+    *,
+    root: Path,
+    css_dir: Path,
+    out_file: Path,
+    css_files: List[Path],
+    scale: float,
+    min_width: int,
+    include_pointer_fine: bool,
+    dpr_threshold: float,
+    scale_hairlines: bool,
+    hairline_threshold: float,
+    stable_header: bool,
+    keep_nested_media: bool,
+    cache: Optional[ParseCache] = None,
+) -> Tuple[str, RunReport]:
+    """Lee los CSS de disco (nombres relativos a root) y delega en generate_override_text."""
+    sources = [(f.relative_to(root).as_posix(), f.read_text(encoding="utf-8", errors="ignore")) for f in css_files]
+    options = OverrideOptions(
+        scale=scale,
+        min_width=min_width,
+        include_pointer_fine=include_pointer_fine,
+        dpr_threshold=dpr_threshold,
+        scale_hairlines=scale_hairlines,
+        hairline_threshold=hairline_threshold,
+        keep_nested_media=keep_nested_media,
+    )
+    return generate_override_text(sources, options, cache=cache)
 
 
 def _patch_index_html(index_path: Path, link_tag: str, *, dry_run: bool, backup: bool) -> Tuple[bool, Optional[Path]]:
@@ -663,7 +1281,7 @@ def _patch_index_html(index_path: Path, link_tag: str, *, dry_run: bool, backup:
         bak_path = index_path.with_suffix(index_path.suffix + ".bak")
         shutil.copy2(index_path, bak_path)
 
-    index_path.write_text(new_html, encoding="utf-8")
+    replace_text(index_path, new_html)
     return True, bak_path
 
 
@@ -688,6 +1306,11 @@ def main(argv: List[str]) -> int:
     ap.add_argument("--only-linked", action="store_true", help="Procesar solo CSS linkeados en index.html")
 
     ap.add_argument("--keep-nested-media", action="store_true", help="No filtrar @media internos (mantener todos)")
+    ap.add_argument(
+        "--ir-cache",
+        default=IR_CACHE_FILE,
+        help=f"Cache de IR relativo a root: solo se re-parsean los CSS que cambiaron ('' = sin cache, default: {IR_CACHE_FILE})",
+    )
 
     ap.add_argument("--dry-run", action="store_true", help="No escribe archivos; solo reporte")
     ap.add_argument("--apply", action="store_true", help="Escribe retina-80.css si cambió")
@@ -709,9 +1332,12 @@ def main(argv: List[str]) -> int:
         print(f"ERROR: no existe css-dir: {css_dir}")
         return 2
 
+    ir_path = (root / args.ir_cache).resolve() if args.ir_cache else None
+    cache = ParseCache.load(ir_path) if ir_path else None
+
     css_files = []
     if args.order_from_html and index_html.exists():
-        css_files = _resolve_css_files_in_order(root, css_dir, index_html, out_file.name, args.only_linked)
+        css_files = resolve_css_files_in_order(root, css_dir, index_html, out_file.name, args.only_linked)
     else:
         css_files = sorted(p for p in css_dir.rglob("*.css") if p.name != out_file.name)
 
@@ -728,7 +1354,14 @@ def main(argv: List[str]) -> int:
         hairline_threshold=float(args.hairline_threshold),
         stable_header=(not args.unstable_header),
         keep_nested_media=bool(args.keep_nested_media),
+        cache=cache,
     )
+    # En dry-run no se escribe nada, tampoco el cache.
+    if cache is not None and not args.dry_run:
+        cache.save(ir_path, [f.relative_to(root).as_posix() for f in css_files])
+
+    for w in report.warnings:
+        print(f"WARN: {w}")
 
     # Reporte
     print("\n=== RETINA-80 GENERATION REPORT (v2) ===")
@@ -737,20 +1370,27 @@ def main(argv: List[str]) -> int:
     print(f"retina threshold: DPR >= {report.dpr_threshold:g}")
     print(f"pointer/hover filter: {report.include_pointer_fine}")
     print(f"hairlines: {'ESCALAR' if report.scale_hairlines else 'NO escalar'} (<= {report.hairline_threshold}px)")
-    print(f"nested @media filter: {'KEEP ALL' if args.keep_nested_media else 'SKIP mobile-only max-width<=960'}")
+    print(f"nested @media filter: {'KEEP ALL' if args.keep_nested_media else 'EVAL vs outer @media (prune/simplify)'}")
     print(f"css files scanned: {report.files_scanned} (order={'HTML' if args.order_from_html and index_html.exists() else 'filesystem'})")
     print(f"files with changes: {report.files_with_changes}")
     print(f"rules emitted: {report.rules_emitted}")
     print(f"decls changed: {report.total_decls_changed}")
     print(f"px tokens replaced: {report.total_px_replaced}")
     print(f"nested @media skipped: {report.media_rules_skipped}")
+    print(f"nested @media simplified: {report.media_rules_simplified}")
+    print(f"nested @media flattened: {report.media_rules_flattened}")
 
     touched = [r for r in report.per_file if r.decls_changed > 0]
     if touched:
         print("\nTouched files:")
         for r in touched:
-            rel = r.path.relative_to(root).as_posix()
-            print(f"  - {rel}: {r.decls_changed} decls | {r.px_replaced} px | skipped_media={r.media_rules_skipped}")
+            print(f"  - {r.name}: {r.decls_changed} decls | {r.px_replaced} px | skipped_media={r.media_rules_skipped}")
+
+    if report.media_changes:
+        print("\nNested @media changes:")
+        for mc in report.media_changes:
+            after = f" -> @media {mc.after}" if mc.after else ""
+            print(f"  • {mc.file} | {mc.action}: @media {mc.before}{after}")
 
     if report.examples:
         print("\nExamples (first 12):")
@@ -765,7 +1405,7 @@ def main(argv: List[str]) -> int:
         print("\nNothing written (pass --apply to write).")
         return 0
 
-    wrote, bak = _write_with_backup_if_changed(out_file, content, backup=bool(args.backup))
+    wrote, bak = write_with_backup_if_changed(out_file, content, backup=bool(args.backup))
     if wrote:
         print(f"\nOK: wrote {out_file.relative_to(root).as_posix()}")
         if bak:
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+site_io.py
+
+Helpers compartidos por las herramientas de tools/ (retina_scale_css, bundle_js,
+lazy_images, lqip_thumbs, build):
+- Escritura atómica e idempotente (solo si el contenido cambió, .bak opcional).
+- Páginas del sitio y resolución de src/href locales.
+
+No es un script: se importa desde las demás herramientas.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+# Páginas del sitio (globs relativos a root).
+DEFAULT_PAGES = ["index.html", "work/*/index.html", "testimonials/index.html"]
+
+_REMOTE_RE = re.compile(r"^([a-z][a-z0-9+.-]*:|//)", re.IGNORECASE)
+
+
+# -----------------------------
+# Escritura
+# -----------------------------
+
+def replace_bytes(path: Path, data: bytes) -> None:
+    """
+    Escribe en un temporal y lo renombra encima (atómico): quien lea el archivo en paralelo
+    (p.ej. otro stage de tools/build.py) ve la versión vieja o la nueva, nunca una a medias.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def replace_text(path: Path, content: str) -> None:
+    """replace_bytes para texto (UTF-8)."""
+    replace_bytes(path, content.encode("utf-8"))
+
+
+def write_text_if_changed(path: Path, content: str) -> Tuple[bool, Optional[Path]]:
+    """
+    Escribe solo si cambió. Devuelve (wrote, backup_path).
+    No hace backup acá; solo compara.
+    """
+    if path.exists():
+        old = path.read_text(encoding="utf-8", errors="ignore")
+        if old == content:
+            return False, None
+    replace_text(path, content)
+    return True, None
+
+
+def write_with_backup_if_changed(path: Path, content: str, backup: bool) -> Tuple[bool, Optional[Path]]:
+    """
+    Escribe solo si cambió; si cambia y backup=True, crea .bak (sin timestamp para idempotencia extra).
+    """
+    if path.exists():
+        old = path.read_text(encoding="utf-8", errors="ignore")
+        if old == content:
+            return False, None
+        bak_path = None
+        if backup:
+            bak_path = path.with_suffix(path.suffix + ".bak")
+            shutil.copy2(path, bak_path)
+        replace_text(path, content)
+        return True, bak_path
+
+    replace_text(path, content)
+    return True, None
+
+
+# -----------------------------
+# Páginas y paths
+# -----------------------------
+
+def find_pages(root: Path, patterns: List[str]) -> List[Path]:
+    """Páginas HTML que matchean los globs (relativos a root), sin repetir y en orden."""
+    pages: List[Path] = []
+    for pat in patterns:
+        for p in sorted(root.glob(pat)):
+            if p.is_file() and p not in pages:
+                pages.append(p.resolve())
+    return pages
+
+
+def local_path(root: Path, page: Path, src: Optional[str]) -> Optional[Path]:
+    """Archivo local referenciado por src (relativo a la página o a root); None si es externo/data:."""
+    src = (src or "").split("#", 1)[0].split("?", 1)[0]
+    if not src or _REMOTE_RE.match(src):
+        return None
+    p = ((root / src.lstrip("/")) if src.startswith("/") else (page.parent / src)).resolve()
+    return p if p.is_file() and root in p.parents else None